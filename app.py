@@ -1,6 +1,6 @@
 import streamlit as st
 from spam_filter import SpamFilter
-import time
+from email_ingest import RawEmail
 
 # -----------------------------------------------------------------------------
 # PAGE CONFIGURATION
@@ -135,6 +135,13 @@ st.markdown("""
 # APP LOGIC
 # -----------------------------------------------------------------------------
 
+STAGE_LABELS = {
+    'signature': "Scanning signatures",
+    'links': "Auditing hyperlinks",
+    'unsubscribe': "Checking compliance",
+}
+
+
 @st.cache_resource
 def load_spam_filter():
     return SpamFilter()
@@ -142,6 +149,107 @@ def load_spam_filter():
 
 spam_filter = load_spam_filter()
 
+
+# Link verdicts depend on certificates, so results expire like the shortest
+# certificate cache entry (failed checks) and get re-checked after that
+@st.cache_data(max_entries=1000, ttl=spam_filter.link_detector.negative_ttl, show_spinner=False)
+def analyze_cached(content_hash, _email_text, _on_stage=None):
+    # Cached by the normalized content hash only (underscore args are not hashed),
+    # so re-opening the same message reuses its earlier result
+    return spam_filter.analyze_email(_email_text, on_stage=_on_stage)
+
+
+def decode_upload(uploaded_file):
+    # Handles plain .txt emails as well as raw .eml messages with MIME parts
+    return RawEmail.from_bytes(uploaded_file.getvalue()).text
+
+
+def create_card(title, desc, is_spam, partial=False):
+    color = "#f38ba8" if is_spam else "#a6e3a1"  # Red vs Green
+    icon = "❌ CRITICAL" if is_spam else "✅ SECURE"
+    if partial:
+        # Ran out of time budget before reaching a result
+        color, icon = "#f9e2af", "⌛ INCOMPLETE"
+    elif is_spam is None:
+        # Detector skipped because the vote was already decided
+        color, icon = "#6c7086", "⏭ SKIPPED"
+
+    st.markdown(f"""
+    <div class="metric-card" style="border-left-color: {color};">
+        <div style="display: flex; justify-content: space-between; align-items: center;">
+            <strong style="font-size: 1.1em; color: #fff; font-family: 'Orbitron'">{title}</strong>
+            <span style="color: {color}; font-weight: bold; border: 1px solid {color}; padding: 2px 8px; border-radius: 4px; font-size: 0.8em;">{icon}</span>
+        </div>
+        <div style="font-size: 0.9em; color: #cdd6f4; margin-top: 8px;">{desc}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def count_votes(results):
+    return sum(bool(results[key]['is_spam']) for key in ('signature', 'links', 'unsubscribe'))
+
+
+def show_report(verdict, results):
+    # VERDICT DISPLAY
+    if verdict == "Spam":
+        st.markdown("""
+        <div style="background-color: rgba(243, 139, 168, 0.15); border: 2px solid #f38ba8; padding: 20px; border-radius: 10px; text-align: center; margin-bottom: 20px; box-shadow: 0 0 20px rgba(243, 139, 168, 0.2);">
+            <h1 style="color: #f38ba8; margin:0; text-shadow: 0 0 10px #f38ba8; font-size: 2rem;">🚫 THREAT DETECTED</h1>
+            <p style="color: #cdd6f4; margin:5px 0 0 0; font-family: 'JetBrains Mono'; letter-spacing: 1px;">MALICIOUS PATTERNS IDENTIFIED</p>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown("""
+        <div style="background-color: rgba(166, 227, 161, 0.15); border: 2px solid #a6e3a1; padding: 20px; border-radius: 10px; text-align: center; margin-bottom: 20px; box-shadow: 0 0 20px rgba(166, 227, 161, 0.2);">
+            <h1 style="color: #a6e3a1; margin:0; text-shadow: 0 0 10px #a6e3a1; font-size: 2rem;">✅ SYSTEM CLEAR</h1>
+            <p style="color: #cdd6f4; margin:5px 0 0 0; font-family: 'JetBrains Mono'; letter-spacing: 1px;">CONTENT APPEARS LEGITIMATE</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    # DETAILED METRICS
+    st.markdown(
+        "<p style='color: #a6adc8; font-family: Orbitron; letter-spacing: 1px;'>DETAILED FORENSICS:</p>",
+        unsafe_allow_html=True)
+
+    create_card("SIGNATURE MATCHING", "Hash comparison against known threat database.",
+                results['signature']['is_spam'])
+    create_card("HYPERLINK AUDIT", "SSL certificate validation and protocol analysis.",
+                results['links']['is_spam'], results['links'].get('partial', False))
+    create_card("COMPLIANCE CHECK", "Regulatory unsubscribe mechanism detection.",
+                results['unsubscribe']['is_spam'])
+
+    spam_count = count_votes(results)
+    st.caption(f"🤖 **ALGORITHM LOGIC:** {spam_count}/3 DETECTION VECTORS TRIGGERED.")
+
+
+def analyze_batch(emails):
+    # One pass over all emails with a progress bar driven by real detector stages
+    total_steps = len(emails) * len(STAGE_LABELS)
+    my_bar = st.progress(0, text="Preparing scan...")
+    reports = []
+
+    for index, (name, email_text) in enumerate(emails):
+        done_before = index * len(STAGE_LABELS)
+        stages_seen = []
+
+        def on_stage(key):
+            stages_seen.append(key)
+            step = done_before + len(stages_seen)
+            my_bar.progress(step / total_steps,
+                            text=f"[{index + 1}/{len(emails)}] {name}: {STAGE_LABELS[key]}...")
+
+        content_hash = spam_filter.signature_detector.create_signature(email_text)
+        verdict, results = analyze_cached(content_hash, email_text, on_stage)
+        reports.append((name, verdict, results))
+
+        # A cached result runs no stages, so move the bar past this email here
+        my_bar.progress((index + 1) * len(STAGE_LABELS) / total_steps,
+                        text=f"[{index + 1}/{len(emails)}] {name}: Scan complete")
+
+    my_bar.empty()
+    return reports
+
+
 # Header Section
 col_logo, col_header = st.columns([1, 8])
 with col_header:
@@ -164,9 +272,10 @@ with input_col:
     st.subheader("INPUT STREAM")
 
     with st.container():
-        input_method = st.radio("SELECT SOURCE:", ["PASTE TEXT", "UPLOAD FILE"], horizontal=True)
+        input_method = st.radio("SELECT SOURCE:", ["PASTE TEXT", "UPLOAD FILES"], horizontal=True)
 
-        email_text = ""
+        # (name, email_text) pairs to analyze
+        emails = []
 
         if input_method == "PASTE TEXT":
             email_text = st.text_area(
@@ -174,11 +283,17 @@ with input_col:
                 height=400,
                 placeholder="> Awaiting data input..."
             )
+            if email_text.strip():
+                emails.append(("Pasted email", email_text))
         else:
-            uploaded_file = st.file_uploader("UPLOAD .TXT LOG", type=['txt'])
-            if uploaded_file is not None:
-                email_text = uploaded_file.read().decode('utf-8')
-                st.code(email_text, language="text")
+            uploaded_files = st.file_uploader("UPLOAD .TXT / .EML LOGS", type=['txt', 'eml'],
+                                              accept_multiple_files=True)
+            for uploaded_file in uploaded_files or []:
+                emails.append((uploaded_file.name, decode_upload(uploaded_file)))
+            if len(emails) == 1:
+                st.code(emails[0][1], language="text")
+            elif emails:
+                st.caption(f"{len(emails)} FILES QUEUED FOR BATCH SCAN")
 
         st.write("")  # Spacer
         analyze_button = st.button("INITIATE SCAN PROTOCOL", type="primary")
@@ -187,67 +302,32 @@ with results_col:
     st.subheader("THREAT ANALYSIS")
 
     if analyze_button:
-        if not email_text.strip():
+        if not emails:
             st.warning("⚠️ ERROR: NO DATA STREAM DETECTED")
         else:
-            # Fake loading bar effect
-            progress_text = "Scanning signatures..."
-            my_bar = st.progress(0, text=progress_text)
-            for percent_complete in range(100):
-                time.sleep(0.005)
-                my_bar.progress(percent_complete + 1, text="Analyzing Heuristics...")
-            my_bar.empty()
-
-            # Real Analysis
-            verdict, results = spam_filter.analyze_email(email_text)
-
-            # VERDICT DISPLAY
-            if verdict == "Spam":
-                st.markdown("""
-                <div style="background-color: rgba(243, 139, 168, 0.15); border: 2px solid #f38ba8; padding: 20px; border-radius: 10px; text-align: center; margin-bottom: 20px; box-shadow: 0 0 20px rgba(243, 139, 168, 0.2);">
-                    <h1 style="color: #f38ba8; margin:0; text-shadow: 0 0 10px #f38ba8; font-size: 2rem;">🚫 THREAT DETECTED</h1>
-                    <p style="color: #cdd6f4; margin:5px 0 0 0; font-family: 'JetBrains Mono'; letter-spacing: 1px;">MALICIOUS PATTERNS IDENTIFIED</p>
-                </div>
-                """, unsafe_allow_html=True)
+            reports = analyze_batch(emails)
+
+            if len(reports) == 1:
+                _, verdict, results = reports[0]
+                show_report(verdict, results)
             else:
-                st.markdown("""
-                <div style="background-color: rgba(166, 227, 161, 0.15); border: 2px solid #a6e3a1; padding: 20px; border-radius: 10px; text-align: center; margin-bottom: 20px; box-shadow: 0 0 20px rgba(166, 227, 161, 0.2);">
-                    <h1 style="color: #a6e3a1; margin:0; text-shadow: 0 0 10px #a6e3a1; font-size: 2rem;">✅ SYSTEM CLEAR</h1>
-                    <p style="color: #cdd6f4; margin:5px 0 0 0; font-family: 'JetBrains Mono'; letter-spacing: 1px;">CONTENT APPEARS LEGITIMATE</p>
-                </div>
-                """, unsafe_allow_html=True)
-
-            # DETAILED METRICS
-            st.markdown(
-                "<p style='color: #a6adc8; font-family: Orbitron; letter-spacing: 1px;'>DETAILED FORENSICS:</p>",
-                unsafe_allow_html=True)
-
-
-            def create_card(title, desc, is_spam):
-                color = "#f38ba8" if is_spam else "#a6e3a1"  # Red vs Green
-                icon = "❌ CRITICAL" if is_spam else "✅ SECURE"
-
-                st.markdown(f"""
-                <div class="metric-card" style="border-left-color: {color};">
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <strong style="font-size: 1.1em; color: #fff; font-family: 'Orbitron'">{title}</strong>
-                        <span style="color: {color}; font-weight: bold; border: 1px solid {color}; padding: 2px 8px; border-radius: 4px; font-size: 0.8em;">{icon}</span>
-                    </div>
-                    <div style="font-size: 0.9em; color: #cdd6f4; margin-top: 8px;">{desc}</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-
-            create_card("SIGNATURE MATCHING", "Hash comparison against known threat database.",
-                        results['signature']['is_spam'])
-            create_card("HYPERLINK AUDIT", "SSL certificate validation and protocol analysis.",
-                        results['links']['is_spam'])
-            create_card("COMPLIANCE CHECK", "Regulatory unsubscribe mechanism detection.",
-                        results['unsubscribe']['is_spam'])
-
-            spam_count = sum(
-                [results['signature']['is_spam'], results['links']['is_spam'], results['unsubscribe']['is_spam']])
-            st.caption(f"🤖 **ALGORITHM LOGIC:** {spam_count}/3 DETECTION VECTORS TRIGGERED.")
+                spam_total = sum(1 for _, verdict, _ in reports if verdict == "Spam")
+                st.markdown(
+                    f"<p style='color: #a6adc8; font-family: Orbitron; letter-spacing: 1px;'>"
+                    f"BATCH SUMMARY: {spam_total}/{len(reports)} THREATS DETECTED</p>",
+                    unsafe_allow_html=True)
+                st.dataframe(
+                    [
+                        {"FILE": name, "VERDICT": verdict, "VECTORS": f"{count_votes(results)}/3"}
+                        for name, verdict, results in reports
+                    ],
+                    use_container_width=True,
+                    hide_index=True
+                )
+                for name, verdict, results in reports:
+                    icon = "🚫" if verdict == "Spam" else "✅"
+                    with st.expander(f"{icon} {name}"):
+                        show_report(verdict, results)
 
     else:
         st.info("ℹ️ AWAITING INPUT FOR ANALYSIS...")
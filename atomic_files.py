@@ -0,0 +1,98 @@
+"""
+Crash- and Concurrency-Safe File Helpers
+Atomic write-then-rename and inter-process file locks for the signature files
+"""
+
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+def atomic_write(path, data):
+    """
+    Replace a file's contents so readers see either the old or the new file
+
+    The data goes to a uniquely named temporary file in the same folder,
+    is flushed to disk, and is then renamed over the target.
+
+    Args:
+        path (str): File to write
+        data (bytes): New contents
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FileLock:
+    """Advisory inter-process lock on a file, shared or exclusive (a context manager)"""
+
+    def __init__(self, path, shared=False):
+        """
+        Initialize the lock
+
+        Args:
+            path (str): Lock file (created if missing)
+            shared (bool): Take a shared lock, which only excludes exclusive
+                holders (Windows has no shared locks, so it is exclusive there)
+        """
+        self.path = path
+        self.shared = shared
+        self._fd = None
+
+    def acquire(self):
+        """Block until the lock is held"""
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        # LK_LOCK only retries for ~10 seconds before giving up
+                        msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except BaseException:
+            os.close(self._fd)
+            self._fd = None
+            raise
+
+    def release(self):
+        """Release the lock"""
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
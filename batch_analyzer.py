@@ -0,0 +1,282 @@
+"""
+Batch Email Analysis
+Spreads SpamFilter analysis across a process pool, one warm filter per worker
+"""
+
+import copy
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from email_ingest import RawEmail
+from signature_detector import email_digest
+from spam_filter import SpamFilter
+
+
+# The SpamFilter owned by this worker process (built once by _init_worker)
+_worker_filter = None
+
+
+def _init_worker(filter_options):
+    """Build the worker's SpamFilter once, when the process starts"""
+    global _worker_filter
+    _worker_filter = SpamFilter(**filter_options)
+
+
+def _analyze_chunk(chunk):
+    """Analyze a chunk of (index, email_text) pairs in a worker process"""
+    results = []
+    for index, email_text in chunk:
+        try:
+            verdict, details = _worker_filter.analyze_email(email_text)
+        except Exception as e:
+            verdict, details = "Error", {"error": str(e)}
+        results.append((index, verdict, details))
+    return results
+
+
+def _analyze_file_chunk(chunk):
+    """Read and analyze a chunk of (index, path) pairs in a worker process"""
+    results = []
+    for index, path in chunk:
+        start = time.perf_counter()
+        try:
+            email_text = RawEmail.from_file(path).text
+            verdict, details = _worker_filter.analyze_email(email_text)
+        except Exception as e:
+            verdict, details = "Error", {"error": str(e)}
+        results.append((index, verdict, details, time.perf_counter() - start))
+    return results
+
+
+def _chunks(items, chunksize):
+    """Split an iterable into lists of (index, item) pairs"""
+    numbered = enumerate(items)
+    while True:
+        chunk = list(itertools.islice(numbered, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_pool(task, items, workers, chunksize, ordered, filter_options):
+    """Run a chunk task over items on a pool of warm SpamFilter workers"""
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    chunks = _chunks(items, chunksize)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(filter_options or {},)) as pool:
+        pending = deque()
+
+        def fill():
+            for chunk in itertools.islice(chunks, max_pending - len(pending)):
+                pending.append(pool.submit(task, chunk))
+
+        fill()
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                for future in done:
+                    pending.remove(future)
+
+            for future in done:
+                yield from future.result()
+            fill()
+
+
+def _collapse_duplicates(emails, analyze, stats):
+    """
+    Analyze each distinct email once and fan the result out to its copies
+
+    Emails are grouped by the normalized hash the signature detector uses.
+
+    Args:
+        emails (iterable): Email texts
+        analyze (callable): Runs an iterable of unique emails, yielding
+            (unique index, verdict, details)
+        stats (dict): Filled with 'emails' and 'duplicates' counts
+
+    Yields:
+        tuple: (index, verdict, details) for every input email, as ready
+    """
+    unique_ids = {}
+    waiting = {}
+    finished = {}
+    late = []
+    stats.update(emails=0, duplicates=0)
+
+    def unique_emails():
+        for index, email_text in enumerate(emails):
+            stats['emails'] += 1
+            digest = email_digest(email_text)
+            unique_id = unique_ids.get(digest)
+            if unique_id is None:
+                unique_id = unique_ids[digest] = len(unique_ids)
+                waiting[unique_id] = [index]
+                yield email_text
+                continue
+
+            stats['duplicates'] += 1
+            if unique_id in finished:
+                late.append((index, unique_id))
+            else:
+                waiting[unique_id].append(index)
+
+    def drain_late():
+        while late:
+            index, unique_id = late.pop()
+            verdict, details = finished[unique_id]
+            yield index, verdict, copy.deepcopy(details)
+
+    for unique_id, verdict, details in analyze(unique_emails()):
+        finished[unique_id] = (verdict, details)
+        indices = waiting.pop(unique_id)
+        yield indices[0], verdict, details
+        for index in indices[1:]:
+            yield index, verdict, copy.deepcopy(details)
+        yield from drain_late()
+    yield from drain_late()
+
+
+def _in_order(results):
+    """Re-order (index, ...) tuples into index order"""
+    buffered = {}
+    next_index = 0
+    for result in results:
+        buffered[result[0]] = result
+        while next_index in buffered:
+            yield buffered.pop(next_index)
+            next_index += 1
+
+
+def analyze_many(emails, workers=None, chunksize=16, ordered=True, filter_options=None,
+                 collapse_duplicates=True, stats=None):
+    """
+    Analyze many emails in parallel
+
+    Emails are read lazily from the iterable and sent to workers in
+    chunks; at most two chunks per worker are in flight at once.
+    Identical emails (after normalization) are analyzed only once.
+
+    Args:
+        emails (iterable): Email texts to analyze
+        workers (int): Number of worker processes (default: CPU count)
+        chunksize (int): Number of emails sent to a worker at a time
+        ordered (bool): Yield results in input order (True) or as soon as
+            each chunk completes (False)
+        filter_options (dict): Keyword arguments for each worker's SpamFilter
+        collapse_duplicates (bool): Analyze repeated emails only once
+        stats (dict): If given, filled with 'emails' and 'duplicates' counts
+
+    Yields:
+        tuple: (index, verdict, detailed_results) where index is the
+            email's position in the input; an email that fails to analyze
+            gets verdict "Error" and {"error": message}
+    """
+    if not collapse_duplicates:
+        return _run_pool(_analyze_chunk, emails, workers, chunksize, ordered, filter_options)
+
+    def analyze(unique_emails):
+        return _run_pool(_analyze_chunk, unique_emails, workers, chunksize, ordered, filter_options)
+
+    results = _collapse_duplicates(emails, analyze, stats if stats is not None else {})
+    return _in_order(results) if ordered else results
+
+
+def iter_message_files(root):
+    """
+    Yield message files under a directory or maildir tree
+
+    Hidden files and maildir tmp/ folders (messages still being delivered)
+    are skipped.
+
+    Args:
+        root (str): Directory to walk
+
+    Yields:
+        str: Path to each message file, in sorted order per directory
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        is_maildir = {'cur', 'new'} <= set(dirnames)
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith('.') and not (is_maildir and d == 'tmp')
+        )
+        for filename in sorted(filenames):
+            if not filename.startswith('.'):
+                yield os.path.join(dirpath, filename)
+
+
+def load_scanned_paths(output_path):
+    """
+    Read the paths already recorded in a scan output file
+
+    A partially written last line (from an interrupted run) is removed so
+    new records can be appended cleanly.
+
+    Args:
+        output_path (str): Path to a JSONL scan output file
+
+    Returns:
+        set: Paths that already have a result
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    with open(output_path, 'rb+') as f:
+        data = f.read()
+        complete = data.rfind(b'\n') + 1
+        if complete < len(data):
+            f.truncate(complete)
+
+    scanned = set()
+    for line in data[:complete].splitlines():
+        try:
+            scanned.add(json.loads(line)['path'])
+        except (ValueError, KeyError):
+            continue
+    return scanned
+
+
+def scan_directory(root, output, workers=None, chunksize=16, skip=(), filter_options=None):
+    """
+    Analyze every message under a directory, writing one JSON line each
+
+    Args:
+        root (str): Directory or maildir tree to scan
+        output (file): Text stream to write JSON lines to
+        workers (int): Number of worker processes (default: CPU count)
+        chunksize (int): Number of messages sent to a worker at a time
+        skip (set): Paths to leave out (e.g. already scanned)
+        filter_options (dict): Keyword arguments for each worker's SpamFilter
+
+    Returns:
+        dict: Counts of scanned messages, spam verdicts and errors
+    """
+    paths = [path for path in iter_message_files(root) if path not in skip]
+    counts = {'scanned': 0, 'spam': 0, 'errors': 0}
+
+    results = _run_pool(_analyze_file_chunk, paths, workers, chunksize, False, filter_options)
+    for index, verdict, details, seconds in results:
+        record = {
+            'path': paths[index],
+            'verdict': verdict,
+            'results': details,
+            'seconds': round(seconds, 6),
+        }
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+
+        counts['scanned'] += 1
+        if verdict == "Spam":
+            counts['spam'] += 1
+        elif verdict == "Error":
+            counts['errors'] += 1
+    return counts
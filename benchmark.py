@@ -0,0 +1,354 @@
+"""
+Spam Filter Benchmark Suite
+Generates synthetic email corpora and times each detector and the full pipeline,
+using local stand-in HTTPS servers instead of real hosts for link checks
+
+Usage:
+    python benchmark.py --size 2000 --link-density 4 --duplicate-rate 0.3 --output bench.json
+"""
+
+import json
+import os
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from link_detector import LinkDetector
+from signature_detector import SignatureDetector
+from spam_filter import SpamFilter
+from unsubscribe_detector import UnsubscribeDetector
+
+
+WORDS = (
+    "account offer free winner click claim prize bank update verify limited "
+    "urgent money deal order shipping invoice team meeting report schedule "
+    "project review password security notice customer service reward bonus"
+).split()
+
+# Stand-in server kinds: a trusted certificate, an untrusted (self-signed)
+# certificate, and a host that accepts connections but never completes a handshake
+SERVER_KINDS = ('valid', 'invalid', 'timeout')
+
+
+def generate_corpus(size, link_density=3, body_length=150, duplicate_rate=0.2,
+                    spam_rate=0.5, link_hosts=None, seed=42):
+    """
+    Generate a synthetic email corpus
+
+    Args:
+        size (int): Number of emails
+        link_density (float): Average number of links per email
+        body_length (int): Approximate number of words per body
+        duplicate_rate (float): Fraction of emails that repeat an earlier one
+        spam_rate (float): Fraction of emails without an unsubscribe footer
+        link_hosts (list): 'host:port' targets for HTTPS links
+            (default: example.com hosts with plain HTTP links only)
+        seed (int): Random seed, so corpora are reproducible
+
+    Returns:
+        list: Email texts
+    """
+    rng = random.Random(seed)
+    emails = []
+
+    for i in range(size):
+        if emails and rng.random() < duplicate_rate:
+            emails.append(rng.choice(emails))
+            continue
+
+        words = [rng.choice(WORDS) for _ in range(body_length)]
+        for _ in range(_poisson(rng, link_density)):
+            if link_hosts and rng.random() < 0.7:
+                link = f"https://{rng.choice(link_hosts)}/{rng.choice(WORDS)}?id={rng.randint(0, 9999)}"
+            else:
+                link = f"http://promo{rng.randint(0, 50)}.example.com/{rng.choice(WORDS)}"
+            words.insert(rng.randrange(len(words) + 1), link)
+
+        lines = [' '.join(words[j:j + 12]) for j in range(0, len(words), 12)]
+        body = '\n'.join(lines)
+        if rng.random() >= spam_rate:
+            body += "\n\n---\nTo unsubscribe from these emails, update your email preferences."
+
+        subject = ' '.join(rng.choice(WORDS) for _ in range(5)).title()
+        emails.append(f"From: sender{i}@example.com\nSubject: {subject}\n\n{body}\n")
+
+    return emails
+
+
+def _poisson(rng, mean):
+    """Draw a small Poisson-distributed count (Knuth's method)"""
+    limit, count, product = pow(2.718281828459045, -mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+class StandInServer:
+    """A local TLS server with controllable latency and certificate behaviour"""
+
+    def __init__(self, kind, certfile=None, keyfile=None, latency=0.0):
+        """
+        Initialize the stand-in server
+
+        Args:
+            kind (str): 'valid', 'invalid' or 'timeout'
+            certfile (str): Server certificate (PEM), unused for 'timeout'
+            keyfile (str): Server private key (PEM), unused for 'timeout'
+            latency (float): Seconds to wait before starting each handshake
+        """
+        self.kind = kind
+        self.latency = latency
+
+        self.context = None
+        if kind != 'timeout':
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.context.load_cert_chain(certfile, keyfile)
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(128)
+        self.port = self.listener.getsockname()[1]
+
+        self._held = []
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    @property
+    def address(self):
+        """The 'host:port' to use in benchmark links"""
+        return f"localhost:{self.port}"
+
+    def _accept_loop(self):
+        """Accept connections and serve each on its own thread"""
+        while self._running:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            if self.kind == 'timeout':
+                # Keep the socket open but never answer
+                self._held.append(conn)
+                continue
+            threading.Thread(target=self._handshake, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn):
+        """Complete (or fail) the TLS handshake after the configured latency"""
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            with self.context.wrap_socket(conn, server_side=True):
+                pass
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        """Stop accepting and release held connections"""
+        self._running = False
+        self.listener.close()
+        for conn in self._held:
+            conn.close()
+
+
+def create_certificates(directory):
+    """
+    Create a local CA, a CA-signed 'localhost' certificate and a self-signed one
+
+    Requires the openssl command-line tool.
+
+    Args:
+        directory (str): Folder to write the PEM files to
+
+    Returns:
+        dict: Paths for 'ca', 'valid_cert', 'valid_key', 'invalid_cert', 'invalid_key'
+    """
+    def path(name):
+        return os.path.join(directory, name)
+
+    def run(*args):
+        subprocess.run(['openssl', *args], check=True, capture_output=True)
+
+    with open(path('san.cnf'), 'w') as f:
+        f.write("subjectAltName=DNS:localhost\n")
+
+    run('req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-subj', '/CN=Benchmark CA', '-keyout', path('ca.key'), '-out', path('ca.pem'))
+    run('req', '-newkey', 'rsa:2048', '-nodes', '-subj', '/CN=localhost',
+        '-keyout', path('valid.key'), '-out', path('valid.csr'))
+    run('x509', '-req', '-in', path('valid.csr'), '-CA', path('ca.pem'), '-CAkey', path('ca.key'),
+        '-CAcreateserial', '-days', '1', '-extfile', path('san.cnf'), '-out', path('valid.pem'))
+    run('req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+        '-addext', 'subjectAltName=DNS:localhost',
+        '-keyout', path('invalid.key'), '-out', path('invalid.pem'))
+
+    return {
+        'ca': path('ca.pem'),
+        'valid_cert': path('valid.pem'),
+        'valid_key': path('valid.key'),
+        'invalid_cert': path('invalid.pem'),
+        'invalid_key': path('invalid.key'),
+    }
+
+
+def time_calls(function, emails):
+    """
+    Time a function over every email
+
+    Args:
+        function (callable): Called with each email text
+        emails (list): Email texts
+
+    Returns:
+        dict: Throughput and latency percentiles
+    """
+    latencies = []
+    start = time.perf_counter()
+    for email_text in emails:
+        call_start = time.perf_counter()
+        function(email_text)
+        latencies.append(time.perf_counter() - call_start)
+    total = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(fraction):
+        if not latencies:
+            return 0.0
+        return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 4)
+
+    return {
+        'emails': len(emails),
+        'seconds': round(total, 6),
+        'emails_per_sec': round(len(emails) / total, 2) if total else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': percentile(1.0),
+    }
+
+
+def run_benchmark(size=1000, link_density=3, body_length=150, duplicate_rate=0.2,
+                  latency=0.02, probe_timeout=0.5, use_tls=True, seed=42):
+    """
+    Run the full benchmark suite
+
+    Args:
+        size (int): Number of emails in the corpus
+        link_density (float): Average links per email
+        body_length (int): Approximate words per body
+        duplicate_rate (float): Fraction of repeated emails
+        latency (float): Handshake delay of the stand-in servers (seconds)
+        probe_timeout (float): LinkDetector connection/handshake timeout
+        use_tls (bool): Start stand-in HTTPS servers (needs openssl)
+        seed (int): Random seed for the corpus
+
+    Returns:
+        dict: Configuration and per-stage results (JSON-serializable)
+    """
+    workdir = tempfile.mkdtemp(prefix='spam_bench_')
+    servers = []
+    try:
+        ssl_context = None
+        if use_tls and shutil.which('openssl'):
+            certs = create_certificates(workdir)
+            servers = [
+                StandInServer('valid', certs['valid_cert'], certs['valid_key'], latency),
+                StandInServer('invalid', certs['invalid_cert'], certs['invalid_key'], latency),
+                StandInServer('timeout'),
+            ]
+            ssl_context = ssl.create_default_context(cafile=certs['ca'])
+        link_hosts = [server.address for server in servers]
+
+        emails = generate_corpus(size, link_density, body_length, duplicate_rate,
+                                 link_hosts=link_hosts, seed=seed)
+
+        # Train a throwaway signature database on part of the corpus
+        signature_detector = SignatureDetector(signatures_file=os.path.join(workdir, 'signatures.json'))
+        for email_text in emails[::10]:
+            signature_detector.spam_signatures.add(signature_detector.create_digest(email_text))
+
+        def new_link_detector():
+            # Fresh detector per stage so certificate caching starts cold
+            return LinkDetector(ssl_context=ssl_context, timeout=probe_timeout)
+
+        unsubscribe_detector = UnsubscribeDetector()
+        link_detector = new_link_detector()
+
+        results = {
+            'signature': time_calls(signature_detector.check_signature, emails),
+            'unsubscribe': time_calls(unsubscribe_detector.check_unsubscribe, emails),
+            'links': time_calls(link_detector.check_links_detailed, emails),
+        }
+        results['links']['certificate_cache'] = link_detector.cache_stats()
+
+        for name, options in (('pipeline', {}), ('pipeline_lazy', {'lazy': True}),
+                              ('pipeline_verdict_cache', {'verdict_cache_size': size})):
+            spam_filter = SpamFilter(**options)
+            spam_filter.signature_detector = signature_detector
+            spam_filter.link_detector = new_link_detector()
+            results[name] = time_calls(spam_filter.analyze_email, emails)
+
+        return {
+            'config': {
+                'size': size,
+                'link_density': link_density,
+                'body_length': body_length,
+                'duplicate_rate': duplicate_rate,
+                'latency': latency,
+                'probe_timeout': probe_timeout,
+                'tls_servers': [server.kind for server in servers],
+                'seed': seed,
+            },
+            'results': results,
+        }
+    finally:
+        for server in servers:
+            server.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    """Command-line entry point for the benchmark suite"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the spam filter on a synthetic corpus")
+    parser.add_argument("--size", type=int, default=1000, help="Number of emails")
+    parser.add_argument("--link-density", type=float, default=3, help="Average links per email")
+    parser.add_argument("--body-length", type=int, default=150, help="Approximate words per body")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="Fraction of repeated emails")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stand-in server handshake delay (s)")
+    parser.add_argument("--probe-timeout", type=float, default=0.5, help="Certificate probe timeout (s)")
+    parser.add_argument("--no-tls", action="store_true", help="Skip the stand-in HTTPS servers")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    options = parser.parse_args()
+
+    report = run_benchmark(
+        size=options.size,
+        link_density=options.link_density,
+        body_length=options.body_length,
+        duplicate_rate=options.duplicate_rate,
+        latency=options.latency,
+        probe_timeout=options.probe_timeout,
+        use_tls=not options.no_tls,
+        seed=options.seed,
+    )
+
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Bloom Filter Prefilter for Signature Lookups
+Answers "definitely not a known signature" from a small bit array, so most
+clean mail never reaches the authoritative signature store
+"""
+
+import hashlib
+import math
+import os
+import struct
+
+from atomic_files import atomic_write
+
+
+# File header: magic, number of bits, number of hash functions, items added,
+# capacity, the target false-positive rate, and the source tag
+HEADER = struct.Struct('<8sQQQQd32s')
+MAGIC = b'SPAMBLM2'
+
+# Size of the tag identifying the data a saved filter was built from
+SOURCE_SIZE = 32
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over raw digests (no false negatives)"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        Initialize an empty Bloom filter
+
+        Args:
+            capacity (int): Number of items the filter is sized for
+            error_rate (float): Target false-positive rate at capacity
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+
+        # Optimal sizes for n items at false-positive rate p:
+        # m = -n ln p / (ln 2)^2 bits and k = (m / n) ln 2 hash functions
+        self.num_bits = max(int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+        # Identifies the data the filter was built from (saved in the file)
+        self.source = bytes(SOURCE_SIZE)
+
+    @classmethod
+    def from_items(cls, items, error_rate=0.01, headroom=2.0, min_capacity=1024):
+        """
+        Build a filter holding the given items
+
+        Args:
+            items (iterable): Raw digests (or other bytes keys)
+            error_rate (float): Target false-positive rate at capacity
+            headroom (float): Capacity as a multiple of the item count, so
+                later additions don't raise the false-positive rate much
+            min_capacity (int): Smallest capacity to allocate
+
+        Returns:
+            BloomFilter: The populated filter
+        """
+        items = list(items)
+        bloom = cls(max(int(len(items) * headroom), min_capacity), error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _positions(self, key):
+        """Bit positions for a key, by double hashing"""
+        # Signature digests are already uniform; other keys get hashed first
+        if len(key) < 16:
+            key = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(key[:8], 'little')
+        second = int.from_bytes(key[8:16], 'little') | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """
+        Add a key to the filter
+
+        Args:
+            key (bytes): Raw digest
+        """
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def memory_bytes(self):
+        """Size of the bit array in bytes"""
+        return len(self.bits)
+
+    def expected_error_rate(self):
+        """
+        Estimate the current false-positive rate from the items added
+
+        Returns:
+            float: Probability that an absent key is reported present
+        """
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def stats(self):
+        """
+        Get the filter's size and accuracy figures
+
+        Returns:
+            dict: items, capacity, bits, hashes, memory_bytes, target and
+                expected false-positive rate
+        """
+        return {
+            'items': self.count,
+            'capacity': self.capacity,
+            'bits': self.num_bits,
+            'hashes': self.num_hashes,
+            'memory_bytes': self.memory_bytes,
+            'target_error_rate': self.error_rate,
+            'expected_error_rate': self.expected_error_rate(),
+        }
+
+    def save(self, path):
+        """
+        Save the filter (replacing the file atomically)
+
+        Args:
+            path (str): Path to the filter file
+        """
+        header = HEADER.pack(MAGIC, self.num_bits, self.num_hashes, self.count,
+                             self.capacity, self.error_rate, self.source)
+        atomic_write(path, header + bytes(self.bits))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a saved filter
+
+        Args:
+            path (str): Path to the filter file
+
+        Returns:
+            BloomFilter: The filter, or None if the file is missing or invalid
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            return None
+
+        magic, num_bits, num_hashes, count, capacity, error_rate, source = HEADER.unpack_from(data)
+        bits = data[HEADER.size:]
+        if magic != MAGIC or len(bits) != (num_bits + 7) // 8:
+            return None
+
+        bloom = cls.__new__(cls)
+        bloom.capacity = capacity
+        bloom.error_rate = error_rate
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.bits = bytearray(bits)
+        bloom.count = count
+        bloom.source = source
+        return bloom
@@ -0,0 +1,241 @@
+"""
+Persistent Domain Reputation Store
+Keeps certificate verdicts per domain in SQLite (WAL mode) so they survive
+restarts and are shared by every worker process on the machine
+"""
+
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain TEXT PRIMARY KEY,
+    has_certificate INTEGER NOT NULL,
+    failure_reason TEXT,
+    checked_at REAL NOT NULL
+)
+"""
+
+
+class DomainStore:
+    """SQLite-backed certificate verdicts with expiry-based refresh"""
+
+    def __init__(self, path='domain_reputation.db', positive_ttl=3600, negative_ttl=300,
+                 busy_timeout=5):
+        """
+        Initialize the domain store
+
+        Args:
+            path (str): Path to the SQLite database (created if missing)
+            positive_ttl (float): Seconds a valid-certificate verdict stays fresh
+                (same default as LinkDetector's certificate cache)
+            negative_ttl (float): Seconds a failed verdict stays fresh
+            busy_timeout (float): Seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.busy_timeout = busy_timeout
+
+        # One connection for reads and one for writes, each shared by all
+        # threads under a lock (probe threads come and go, so per-thread
+        # connections would be opened over and over). Reads don't queue
+        # behind a write that is waiting on another process's lock
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute(SCHEMA)
+        self._writer.commit()
+        self._write_lock = threading.Lock()
+
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+
+    def _connect(self):
+        """Open a connection that any thread may use (callers hold its lock)"""
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _is_fresh(self, has_certificate, checked_at, now):
+        """Check whether a stored verdict is still within its TTL"""
+        ttl = self.positive_ttl if has_certificate else self.negative_ttl
+        return checked_at + ttl > now
+
+    def get(self, domain):
+        """
+        Look up a fresh verdict for a domain
+
+        Args:
+            domain (str): Canonical host (e.g. 'example.com' or 'host:8443')
+
+        Returns:
+            dict: has_certificate, failure_reason and checked_at, or None if
+                the domain is unknown or its verdict has expired
+        """
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT has_certificate, failure_reason, checked_at FROM domains WHERE domain = ?",
+                (domain,)
+            ).fetchone()
+        if row is None or not self._is_fresh(row[0], row[2], time.time()):
+            return None
+        return {'has_certificate': bool(row[0]), 'failure_reason': row[1], 'checked_at': row[2]}
+
+    def put(self, domain, has_certificate, failure_reason=None):
+        """
+        Record a certificate verdict
+
+        Args:
+            domain (str): Canonical host
+            has_certificate (bool): Whether the certificate was valid
+            failure_reason (str): Why the check failed ('certificate',
+                'timeout', 'unreachable'), or None
+        """
+        self.put_many([(domain, has_certificate, failure_reason)])
+
+    def put_many(self, verdicts):
+        """
+        Record several verdicts in one transaction
+
+        Args:
+            verdicts (list): (domain, has_certificate, failure_reason) tuples
+        """
+        now = time.time()
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                "INSERT OR REPLACE INTO domains (domain, has_certificate, failure_reason, checked_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(domain, int(bool(valid)), reason, now) for domain, valid, reason in verdicts]
+            )
+
+    def expired_domains(self, limit=None):
+        """
+        List domains whose verdicts have expired
+
+        Args:
+            limit (int): Maximum number of domains to return (oldest first)
+
+        Returns:
+            list: Domain names due for a refresh
+        """
+        now = time.time()
+        query = (
+            "SELECT domain FROM domains "
+            "WHERE (has_certificate = 1 AND checked_at + ? <= ?) "
+            "OR (has_certificate = 0 AND checked_at + ? <= ?) "
+            "ORDER BY checked_at"
+        )
+        params = [self.positive_ttl, now, self.negative_ttl, now]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._read_lock:
+            return [row[0] for row in self._reader.execute(query, params)]
+
+    def prewarm(self, domains, probe, workers=16, batch_size=100, skip_fresh=True):
+        """
+        Probe many domains and store the results
+
+        Args:
+            domains (iterable): Canonical hosts to check
+            probe (callable): Returns (has_certificate, failure_reason) for a
+                domain, e.g. LinkDetector.probe_certificate
+            workers (int): Number of probes in flight at once
+            batch_size (int): Verdicts written per transaction
+            skip_fresh (bool): Don't re-probe domains with a fresh verdict
+
+        Returns:
+            int: Number of domains probed
+        """
+        pending = [domain for domain in dict.fromkeys(domains)
+                   if not (skip_fresh and self.get(domain) is not None)]
+
+        def check(domain):
+            valid, reason = probe(domain)
+            return domain, valid, reason
+
+        batch = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for verdict in pool.map(check, pending):
+                batch.append(verdict)
+                if len(batch) >= batch_size:
+                    self.put_many(batch)
+                    batch = []
+        if batch:
+            self.put_many(batch)
+        return len(pending)
+
+    def refresh(self, probe, workers=16, limit=None):
+        """
+        Re-probe domains whose verdicts have expired
+
+        Args:
+            probe (callable): Returns (has_certificate, failure_reason) for a domain
+            workers (int): Number of probes in flight at once
+            limit (int): Maximum number of domains to refresh
+
+        Returns:
+            int: Number of domains refreshed
+        """
+        return self.prewarm(self.expired_domains(limit), probe, workers, skip_fresh=False)
+
+    def stats(self):
+        """
+        Count stored domains
+
+        Returns:
+            dict: total, valid, failed and expired counts
+        """
+        with self._read_lock:
+            total, valid = self._reader.execute(
+                "SELECT COUNT(*), COALESCE(SUM(has_certificate), 0) FROM domains"
+            ).fetchone()
+        return {
+            'total': total,
+            'valid': valid,
+            'failed': total - valid,
+            'expired': len(self.expired_domains()),
+        }
+
+
+def main():
+    """Command-line tool for managing the domain reputation store"""
+    import sys
+    from link_detector import LinkDetector, canonical_host
+
+    args = sys.argv[1:]
+    path = 'domain_reputation.db'
+    if '--db' in args:
+        index = args.index('--db')
+        path = args[index + 1]
+        del args[index:index + 2]
+
+    store = DomainStore(path)
+    detector = LinkDetector()
+
+    if len(args) == 2 and args[0] == "prewarm":
+        with open(args[1], 'r', encoding='utf-8') as f:
+            domains = [
+                canonical_host(line.strip() if '://' in line else 'https://' + line.strip())
+                for line in f if line.strip() and not line.startswith('#')
+            ]
+        count = store.prewarm([domain for domain in domains if domain], detector.probe_certificate)
+        print(f"Probed {count} domain(s)")
+    elif len(args) == 1 and args[0] == "refresh":
+        count = store.refresh(detector.probe_certificate)
+        print(f"Refreshed {count} expired domain(s)")
+    elif len(args) == 1 and args[0] == "stats":
+        for name, value in store.stats().items():
+            print(f"{name}: {value}")
+    else:
+        print("Usage:")
+        print("  Prewarm: python domain_store.py prewarm <domains.txt> [--db path]")
+        print("  Refresh: python domain_store.py refresh [--db path]")
+        print("  Stats:   python domain_store.py stats [--db path]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Raw Email Ingestion
+Reads RFC 822 messages, mbox files and maildirs as a stream, keeping only the
+text/plain and text/html parts and decoding them when they are first used
+"""
+
+import base64
+import binascii
+import os
+import quopri
+import re
+from email.parser import BytesHeaderParser
+from email.policy import default as default_policy
+
+
+# A header line looks like "Name: value" (RFC 5322 field name characters)
+_HEADER_LINE = re.compile(rb'^[\x21-\x39\x3b-\x7e]+:')
+
+# Headers kept in the text handed to detectors (matches the .txt email format)
+ANALYSIS_HEADERS = ('From', 'Subject')
+
+# Headers that only real RFC 822 / MIME messages carry. A leading block of
+# "Name: value" lines without any of them (e.g. a .txt email, or a pasted body
+# starting "URGENT: ...") is not parsed as headers; the input is used as-is
+MESSAGE_HEADERS = ('MIME-Version', 'Content-Type', 'Content-Transfer-Encoding', 'Received')
+
+# Most bytes buffered while deciding whether the input starts with headers
+MAX_HEADER_BYTES = 256 * 1024
+
+# Most text collected from a single message before the rest is ignored
+MAX_TEXT_BYTES = 5 * 1024 * 1024
+
+
+class TextPart:
+    """A text/plain or text/html part whose body is decoded on first use"""
+
+    def __init__(self, content_type, charset, transfer_encoding):
+        """
+        Initialize the text part
+
+        Args:
+            content_type (str): 'text/plain' or 'text/html'
+            charset (str): Declared charset (None means UTF-8)
+            transfer_encoding (str): Content-Transfer-Encoding (e.g. 'base64')
+        """
+        self.content_type = content_type
+        self.charset = charset or 'utf-8'
+        self.transfer_encoding = (transfer_encoding or '7bit').lower()
+        self.raw_lines = []
+        self._text = None
+
+    @property
+    def text(self):
+        """The decoded part body (decoded once, then cached)"""
+        if self._text is None:
+            raw = b''.join(self.raw_lines)
+            self.raw_lines = []
+            self._text = self._decode(raw)
+        return self._text
+
+    def _decode(self, raw):
+        """Undo the transfer encoding and charset of the raw body"""
+        if self.transfer_encoding == 'base64':
+            try:
+                raw = base64.b64decode(raw)
+            except (binascii.Error, ValueError):
+                raw = b''
+        elif self.transfer_encoding == 'quoted-printable':
+            raw = quopri.decodestring(raw)
+
+        try:
+            return raw.decode(self.charset, errors='replace')
+        except LookupError:
+            # Unknown charset name
+            return raw.decode('utf-8', errors='replace')
+
+
+class RawEmail:
+    """An email parsed from raw bytes, holding only its headers and text parts"""
+
+    def __init__(self):
+        """Initialize an empty message (use from_bytes, from_file or iter_mbox)"""
+        self.headers = None
+        self.parts = []
+        self.skipped_parts = 0
+
+        # False when the input isn't a MIME message; it is then one plain
+        # text part holding the input unchanged
+        self.is_mime = True
+
+        self._text_bytes = 0
+        self._header_bytes = 0
+        self._state = 'headers'
+        self._header_lines = []
+        self._boundaries = []
+        self._part = None
+        self._top_level = True
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Parse a message from raw RFC 822 bytes
+
+        Args:
+            data (bytes): The raw message
+
+        Returns:
+            RawEmail: The parsed message
+        """
+        message = cls()
+        for line in data.splitlines(keepends=True):
+            message.feed_line(line)
+        message.close()
+        return message
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Parse a message from a file, reading it line by line
+
+        Args:
+            path (str): Path to a raw message or .txt email
+
+        Returns:
+            RawEmail: The parsed message
+        """
+        message = cls()
+        with open(path, 'rb') as f:
+            for line in f:
+                message.feed_line(line)
+        message.close()
+        return message
+
+    def feed_line(self, line):
+        """
+        Consume one line of the raw message
+
+        Args:
+            line (bytes): The line, including its line ending
+        """
+        if self._state == 'headers':
+            self._feed_header_line(line)
+            return
+
+        # Boundary lines end the current part, whichever state we are in
+        if self._boundaries and line.startswith(b'--') and self._check_boundary(line):
+            return
+
+        if self._state == 'body':
+            if self._text_bytes + len(line) <= MAX_TEXT_BYTES:
+                self._part.raw_lines.append(line)
+                self._text_bytes += len(line)
+        # 'skip' (attachments, preambles, epilogues): the line is dropped
+
+    def _feed_header_line(self, line):
+        """Collect header lines until the blank line that ends them"""
+        if self._top_level and line.strip():
+            is_header = _HEADER_LINE.match(line) or (self._header_lines and line[:1] in (b' ', b'\t'))
+            self._header_bytes += len(line)
+            if not is_header or self._header_bytes > MAX_HEADER_BYTES:
+                # Not a header block (e.g. a pasted body): treat it all as text
+                self._use_raw_text(self._header_lines + [line])
+                return
+
+        if line.strip():
+            self._header_lines.append(line)
+            return
+
+        headers = BytesHeaderParser(policy=default_policy).parsebytes(b''.join(self._header_lines))
+        if self._top_level and not any(name in headers for name in MESSAGE_HEADERS):
+            self._use_raw_text(self._header_lines + [line])
+            return
+        self._header_lines = []
+        self._start_entity(headers)
+
+    def _use_raw_text(self, lines):
+        """Treat the whole input as one plain-text part, unchanged"""
+        self.is_mime = False
+        self._header_lines = []
+        self._start_entity(BytesHeaderParser(policy=default_policy).parsebytes(b''))
+        for line in lines:
+            self.feed_line(line)
+
+    def _start_entity(self, headers):
+        """Decide what to do with a message or part once its headers are known"""
+        if self._top_level:
+            self.headers = headers
+            self._top_level = False
+
+        content_type = headers.get_content_type()
+        if headers.get_content_maintype() == 'multipart' and headers.get_param('boundary'):
+            self._boundaries.append(headers.get_param('boundary').encode('utf-8', 'replace'))
+            self._state = 'skip'
+        elif content_type in ('text/plain', 'text/html') and headers.get_content_disposition() != 'attachment':
+            self._part = TextPart(content_type, headers.get_content_charset(),
+                                  headers.get('Content-Transfer-Encoding'))
+            self.parts.append(self._part)
+            self._state = 'body'
+        else:
+            self.skipped_parts += 1
+            self._state = 'skip'
+
+    def _check_boundary(self, line):
+        """Handle a line that may be a multipart boundary; True if it was one"""
+        marker = line.rstrip()[2:]
+        for depth in range(len(self._boundaries) - 1, -1, -1):
+            boundary = self._boundaries[depth]
+            if marker == boundary:
+                # Next part of this multipart begins
+                del self._boundaries[depth + 1:]
+                self._part = None
+                self._state = 'headers'
+                return True
+            if marker == boundary + b'--':
+                # This multipart is finished; skip its epilogue
+                del self._boundaries[depth:]
+                self._part = None
+                self._state = 'skip'
+                return True
+        return False
+
+    def close(self):
+        """Finish parsing (handles messages that end inside the headers)"""
+        if self._state == 'headers' and self._header_lines:
+            if self._top_level:
+                # No blank line after them, so these weren't headers
+                self._use_raw_text(self._header_lines)
+            else:
+                self._feed_header_line(b'\n')
+        if self.headers is None:
+            self.headers = BytesHeaderParser(policy=default_policy).parsebytes(b'')
+
+    @property
+    def plain_text(self):
+        """Decoded text of all text/plain parts"""
+        return '\n'.join(part.text for part in self.parts if part.content_type == 'text/plain')
+
+    @property
+    def html_text(self):
+        """Decoded text of all text/html parts"""
+        return '\n'.join(part.text for part in self.parts if part.content_type == 'text/html')
+
+    @property
+    def text(self):
+        """
+        The text detectors analyze: From/Subject headers followed by the body
+
+        The body is the text/plain parts, or the text/html parts when the
+        message has no plain text. Only the parts used are decoded. Input
+        that isn't a MIME message (e.g. a .txt email) is returned as-is, so
+        it hashes the same as when it was trained on.
+        """
+        if not self.is_mime:
+            return self.plain_text
+        header_lines = [
+            f"{name}: {self.headers[name]}"
+            for name in ANALYSIS_HEADERS
+            if self.headers[name] is not None
+        ]
+        body = self.plain_text or self.html_text
+        if not header_lines:
+            return body
+        return '\n'.join(header_lines) + '\n\n' + body
+
+
+def iter_mbox(path):
+    """
+    Stream the messages in an mbox file
+
+    Args:
+        path (str): Path to the mbox file
+
+    Yields:
+        RawEmail: Each message in the file
+    """
+    message = None
+    previous_blank = True
+    with open(path, 'rb') as f:
+        for line in f:
+            if previous_blank and line.startswith(b'From '):
+                if message is not None:
+                    message.close()
+                    yield message
+                message = RawEmail()
+                previous_blank = False
+                continue
+
+            previous_blank = not line.strip()
+            if message is None:
+                continue
+
+            # Undo mboxrd ">From " quoting
+            if line.startswith(b'>') and line.lstrip(b'>').startswith(b'From '):
+                line = line[1:]
+            message.feed_line(line)
+
+    if message is not None:
+        message.close()
+        yield message
+
+
+def iter_maildir(path):
+    """
+    Stream the delivered messages in a maildir (cur/ and new/)
+
+    Args:
+        path (str): Path to the maildir
+
+    Yields:
+        RawEmail: Each message
+    """
+    for folder in ('cur', 'new'):
+        folder_path = os.path.join(path, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for filename in sorted(os.listdir(folder_path)):
+            if not filename.startswith('.'):
+                yield RawEmail.from_file(os.path.join(folder_path, filename))
@@ -0,0 +1,244 @@
+"""
+Fuzzy Signature Matching for Spam Detection
+Builds MinHash fingerprints of emails and finds near-duplicates with an LSH index
+"""
+
+import hashlib
+import json
+import os
+import random
+
+from atomic_files import atomic_write
+
+
+# Large prime and 32-bit mask used by the MinHash permutations
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingle_hashes(email_text, shingle_size=3):
+    """
+    Hash the word shingles of an email's normalized text
+
+    Args:
+        email_text (str): The email content
+        shingle_size (int): Number of words per shingle
+
+    Returns:
+        set: 32-bit hashes of each distinct shingle
+    """
+    words = email_text.lower().split()
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [
+            ' '.join(words[i:i + shingle_size])
+            for i in range(len(words) - shingle_size + 1)
+        ]
+
+    # blake2b is stable across processes, unlike the built-in hash()
+    return {
+        int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+        for s in shingles
+    }
+
+
+def optimal_bands(num_perm, threshold):
+    """
+    Pick the LSH band count whose S-curve threshold is closest to the target
+
+    Args:
+        num_perm (int): Number of MinHash permutations
+        threshold (float): Target Jaccard similarity
+
+    Returns:
+        int: Number of bands (each band has num_perm // bands rows)
+    """
+    best_bands, best_error = 1, float('inf')
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        # Similarity at which a pair becomes a candidate with ~50% probability
+        curve_threshold = (1.0 / bands) ** (1.0 / rows)
+        error = abs(curve_threshold - threshold)
+        if error < best_error:
+            best_bands, best_error = bands, error
+    return best_bands
+
+
+class MinHasher:
+    """Creates MinHash fingerprints from email text"""
+
+    def __init__(self, num_perm=128, shingle_size=3, seed=1):
+        """
+        Initialize the MinHasher
+
+        Args:
+            num_perm (int): Number of hash permutations (fingerprint length)
+            shingle_size (int): Number of words per shingle
+            seed (int): Seed for the permutation parameters
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def fingerprint(self, email_text):
+        """
+        Create a MinHash fingerprint of an email
+
+        Args:
+            email_text (str): The email content
+
+        Returns:
+            tuple: num_perm minimum hash values
+        """
+        hashes = shingle_hashes(email_text, self.shingle_size)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        )
+
+
+def estimate_similarity(fingerprint_a, fingerprint_b):
+    """
+    Estimate the Jaccard similarity of two emails from their fingerprints
+
+    Args:
+        fingerprint_a (tuple): MinHash fingerprint
+        fingerprint_b (tuple): MinHash fingerprint
+
+    Returns:
+        float: Fraction of matching positions (0.0 - 1.0)
+    """
+    matches = sum(1 for a, b in zip(fingerprint_a, fingerprint_b) if a == b)
+    return matches / len(fingerprint_a)
+
+
+class FuzzySignatureIndex:
+    """LSH banding index of MinHash fingerprints for sub-linear lookups"""
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=3, seed=1):
+        """
+        Initialize the fuzzy signature index
+
+        Args:
+            threshold (float): Minimum estimated similarity to count as a match
+            num_perm (int): Number of MinHash permutations
+            shingle_size (int): Number of words per shingle
+            seed (int): Seed for the MinHash permutations
+        """
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size, seed=seed)
+        self.bands = optimal_bands(num_perm, threshold)
+        self.rows = num_perm // self.bands
+
+        self.fingerprints = []
+        self.buckets = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, fingerprint):
+        """Yield (band index, bucket key) pairs for a fingerprint"""
+        for band in range(self.bands):
+            start = band * self.rows
+            yield band, hash(fingerprint[start:start + self.rows])
+
+    def add(self, fingerprint):
+        """
+        Add a fingerprint to the index
+
+        Args:
+            fingerprint (tuple): MinHash fingerprint
+        """
+        fingerprint = tuple(fingerprint)
+        index = len(self.fingerprints)
+        self.fingerprints.append(fingerprint)
+        for band, key in self._band_keys(fingerprint):
+            self.buckets[band].setdefault(key, []).append(index)
+
+    def query(self, fingerprint):
+        """
+        Find the most similar stored fingerprint above the threshold
+
+        Args:
+            fingerprint (tuple): MinHash fingerprint
+
+        Returns:
+            float: Best estimated similarity, or 0.0 if nothing matched
+        """
+        candidates = set()
+        for band, key in self._band_keys(fingerprint):
+            candidates.update(self.buckets[band].get(key, ()))
+
+        best = 0.0
+        for index in candidates:
+            similarity = estimate_similarity(fingerprint, self.fingerprints[index])
+            if similarity >= self.threshold and similarity > best:
+                best = similarity
+        return best
+
+    def add_if_new(self, fingerprint):
+        """
+        Add a fingerprint unless a near-duplicate is already indexed
+
+        Args:
+            fingerprint (tuple): MinHash fingerprint
+
+        Returns:
+            bool: True if the fingerprint was added, False otherwise
+        """
+        if self.query(fingerprint):
+            return False
+        self.add(fingerprint)
+        return True
+
+    def save(self, path):
+        """
+        Save the index parameters and fingerprints to a JSON file
+
+        Args:
+            path (str): Path to the JSON file
+        """
+        data = {
+            'num_perm': self.hasher.num_perm,
+            'shingle_size': self.hasher.shingle_size,
+            'seed': self.hasher.seed,
+            'fingerprints': [list(fp) for fp in self.fingerprints],
+        }
+        atomic_write(path, json.dumps(data).encode('utf-8'))
+
+    @classmethod
+    def load(cls, path, threshold=0.8):
+        """
+        Load an index from a JSON file
+
+        Args:
+            path (str): Path to the JSON file
+            threshold (float): Minimum estimated similarity to count as a match
+
+        Returns:
+            FuzzySignatureIndex: The loaded index (empty if the file is missing)
+        """
+        if not os.path.exists(path):
+            return cls(threshold=threshold)
+
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        index = cls(
+            threshold=threshold,
+            num_perm=data['num_perm'],
+            shingle_size=data['shingle_size'],
+            seed=data['seed'],
+        )
+        for fingerprint in data['fingerprints']:
+            index.add(fingerprint)
+        return index
+
+    def __len__(self):
+        return len(self.fingerprints)
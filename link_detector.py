@@ -3,22 +3,240 @@ Hyperlink Analysis for Spam Detection
 Checks if links use HTTPS and validates SSL certificates
 """
 
+import asyncio
 import re
 import ssl
 import socket
-from urllib.parse import urlparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from urllib.parse import urlsplit
+
+from ttl_cache import TTLCache
+
+
+class CircuitBreaker:
+    """Stops probing hosts that keep failing to respond"""
+
+    def __init__(self, failure_threshold=3, cooldown=300, clock=time.monotonic):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold (int): Consecutive failures before a host is skipped
+            cooldown (float): Seconds to skip a host before probing it again
+            clock (callable): Time source (monotonic seconds)
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def is_open(self, host):
+        """
+        Check whether probes to a host are currently suppressed
+
+        Args:
+            host (str): The host name
+
+        Returns:
+            bool: True if the host should not be probed
+        """
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return False
+            if open_until > self.clock():
+                return True
+            # Cooldown is over: allow one trial probe (half-open)
+            del self._open_until[host]
+            self._failures[host] = self.failure_threshold - 1
+            return False
+
+    def record_success(self, host):
+        """Reset the failure count for a host"""
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+
+    def record_failure(self, host):
+        """Count a failure and open the circuit once the threshold is hit"""
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.failure_threshold:
+                self._open_until[host] = self.clock() + self.cooldown
+
+    def open_hosts(self):
+        """
+        Get hosts whose circuit is currently open
+
+        Returns:
+            list: Host names being skipped
+        """
+        with self._lock:
+            now = self.clock()
+            return [host for host, until in self._open_until.items() if until > now]
+
+
+# Punctuation that ends a sentence rather than a URL
+TRAILING_PUNCTUATION = '.,;:!?*'
+
+# Default ports that canonical hosts leave out
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_host(url):
+    """
+    Get the canonical host of a URL for grouping and certificate checks
+
+    The host is lower-cased, loses any trailing dot and user info, is
+    IDNA-encoded, and keeps the port only if it is not the scheme default.
+
+    Args:
+        url (str): The URL
+
+    Returns:
+        str: 'host' or 'host:port', or None if the URL has no usable host
+    """
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname
+        port = parts.port
+    except ValueError:
+        return None
+    if not host:
+        return None
+
+    host = host.rstrip('.')
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass
+
+    if ':' in host:
+        # IPv6 literal
+        host = f'[{host}]'
+    if port is not None and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f'{host}:{port}'
+    return host
+
+
+def sample_links(links, max_links):
+    """
+    Pick an evenly spaced, deterministic sample of links
+
+    Args:
+        links (list): All links in the email
+        max_links (int): Maximum number of links to keep
+
+    Returns:
+        list: At most max_links links, in their original order
+    """
+    if len(links) <= max_links:
+        return list(links)
+    return [links[i * len(links) // max_links] for i in range(max_links)]
+
+
+class _LinkTally:
+    """Running majority vote over an email's links"""
+
+    def __init__(self, total):
+        self.total = total
+        self.needed = total // 2 + 1
+        self.analyzed = 0
+        self.suspicious = 0
+
+    def add(self, count, suspicious):
+        """Count links whose outcome is known"""
+        self.analyzed += count
+        if suspicious:
+            self.suspicious += count
+
+    def decided(self):
+        """Whether the remaining links can no longer change the outcome"""
+        remaining = self.total - self.analyzed
+        return self.suspicious >= self.needed or self.suspicious + remaining < self.needed
 
 
 class LinkDetector:
     """Analyzes links in emails to detect suspicious URLs"""
 
-    def __init__(self):
-        """Initialize the link detector"""
-        # Regex pattern to find URLs in text
+    def __init__(self, cache_size=1024, positive_ttl=3600, negative_ttl=300,
+                 failure_threshold=3, breaker_cooldown=300, timeout=5,
+                 max_concurrency=8, max_links=None, ssl_context=None,
+                 collect_timings=False, metrics=None, domain_store=None):
+        """
+        Initialize the link detector
+
+        Args:
+            cache_size (int): Maximum number of cached certificate verdicts
+                (0 disables the cache)
+            positive_ttl (float): Seconds to trust a valid-certificate verdict
+            negative_ttl (float): Seconds to trust an invalid-certificate verdict
+            failure_threshold (int): Consecutive connection failures before a
+                host is no longer probed
+            breaker_cooldown (float): Seconds to skip an unreachable host
+            timeout (float): Connection and handshake timeout in seconds
+            max_concurrency (int): Maximum links analyzed at once per email
+                (1 analyzes links one after another)
+            max_links (int): If set, emails with more links than this only
+                have a deterministic sample of max_links links analyzed
+            ssl_context (ssl.SSLContext): Context used to verify certificates
+                (default: the system trust store)
+            collect_timings (bool): Add per-stage timings to link reports
+            metrics (MetricsRegistry): Registry for probe counters and
+                latencies (None disables metrics)
+            domain_store (DomainStore): Persistent verdicts shared with other
+                processes, consulted before probing and updated after
+        """
+        # Regex pattern to find URLs in text: one negated character class,
+        # so matching is a single linear pass with no backtracking. Quotes
+        # and angle brackets end a URL, which also handles href="..." values
         self.url_pattern = re.compile(
-            r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+            r'https?://[^\s"\'<>`\[\]{}|\\^]+',
+            re.IGNORECASE
         )
 
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_links = max_links
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+
+        # Building a context loads the trust store, so do it once and share it
+        self.ssl_context = ssl_context or ssl.create_default_context()
+
+        # Per-domain certificate verdicts and unreachable-host tracking
+        self.cert_cache = TTLCache(maxsize=cache_size) if cache_size else None
+        self.circuit_breaker = CircuitBreaker(failure_threshold, breaker_cooldown)
+        self.domain_store = domain_store
+
+        self.probes = 0
+        self.breaker_skips = 0
+        self.store_hits = 0
+        self._stats_lock = threading.Lock()
+
+        # Async probes in progress, by domain (used from one event loop)
+        self._inflight = {}
+
+        self.collect_timings = collect_timings
+        self.metrics = None
+        if metrics is not None:
+            self.metrics = {
+                'links': metrics.counter('spam_links_analyzed_total', 'Links analyzed'),
+                'probes': metrics.counter('spam_links_probed_total', 'TLS certificate probes made'),
+                'failures': metrics.counter('spam_certificate_failures_total',
+                                            'Certificate probes that failed, by reason'),
+                'timeouts': metrics.counter('spam_certificate_timeouts_total',
+                                            'Certificate probes that timed out'),
+                'probe_seconds': metrics.histogram('spam_certificate_probe_seconds',
+                                                   'Certificate probe latency'),
+            }
+
     def extract_links(self, email_text):
         """
         Extract all URLs from email text
@@ -29,7 +247,13 @@ class LinkDetector:
         Returns:
             list: List of URLs found in the email
         """
-        links = self.url_pattern.findall(email_text)
+        links = []
+        for link in self.url_pattern.findall(email_text):
+            link = link.rstrip(TRAILING_PUNCTUATION)
+            # Drop a closing parenthesis that belongs to the surrounding text
+            while link.endswith(')') and link.count(')') > link.count('('):
+                link = link[:-1].rstrip(TRAILING_PUNCTUATION)
+            links.append(link)
         return links
 
     def is_https(self, url):
@@ -42,7 +266,7 @@ class LinkDetector:
         Returns:
             bool: True if HTTPS, False if HTTP
         """
-        return url.startswith('https://')
+        return url[:8].lower() == 'https://'
 
     def check_certificate(self, domain):
         """
@@ -54,18 +278,228 @@ class LinkDetector:
         Returns:
             bool: True if certificate is valid, False otherwise
         """
+        known = self._known_verdict(domain)
+        if known is not None:
+            return known
+        return self._probe_and_record(domain)
+
+    def _probe_and_record(self, domain):
+        """Probe a domain's certificate and record the verdict"""
+        valid, failure_reason = self.probe_certificate(domain)
+        self._record_verdict(domain, valid, failure_reason)
+        return valid
+
+    async def check_certificate_async(self, domain):
+        """
+        Check if a domain has a valid SSL certificate without blocking the event loop
+
+        Concurrent checks of the same domain share a single lookup and probe,
+        and the shared store is read and written from executor threads.
+
+        Args:
+            domain (str): The domain name (e.g., 'google.com')
+
+        Returns:
+            bool: True if certificate is valid, False otherwise
+        """
+        cached = self._cached_verdict(domain)
+        if cached is not None:
+            return cached
+
+        probe = self._inflight.get(domain)
+        if probe is None:
+            probe = asyncio.ensure_future(self._lookup_or_probe_async(domain))
+            self._inflight[domain] = probe
+            probe.add_done_callback(lambda _: self._inflight.pop(domain, None))
+        # Shielded, so an email that stops waiting doesn't cancel the probe
+        # other emails are waiting on (or the cache entry it will leave)
+        return await asyncio.shield(probe)
+
+    async def _lookup_or_probe_async(self, domain):
+        """Async _known_verdict, then probe and record the verdict if needed"""
+        loop = asyncio.get_running_loop()
+        if self.domain_store is not None:
+            stored = await loop.run_in_executor(None, self.domain_store.get, domain)
+            if stored is not None:
+                return self._use_stored_verdict(domain, stored)
+        if self._circuit_open(domain):
+            return False
+
+        valid, failure_reason = await self.probe_certificate_async(domain)
+        self._note_probe(domain, valid, failure_reason)
+        if self.domain_store is not None:
+            await loop.run_in_executor(None, self.domain_store.put, domain, valid, failure_reason)
+        return valid
+
+    def _known_verdict(self, domain):
+        """Get a verdict without probing (cache, shared store or open circuit), or None"""
+        cached = self._cached_verdict(domain)
+        if cached is not None:
+            return cached
+
+        # Another process (or an earlier run) may already have checked it
+        if self.domain_store is not None:
+            stored = self.domain_store.get(domain)
+            if stored is not None:
+                return self._use_stored_verdict(domain, stored)
+
+        if self._circuit_open(domain):
+            return False
+        return None
+
+    def _cached_verdict(self, domain):
+        """Get the in-memory verdict for a domain, or None"""
+        if self.cert_cache is not None:
+            return self.cert_cache.get(domain)
+        return None
+
+    def _use_stored_verdict(self, domain, stored):
+        """Count and cache a verdict found in the shared store"""
+        with self._stats_lock:
+            self.store_hits += 1
+        # Cached only for what is left of its TTL, so a stored failure isn't
+        # extended each time another worker reads it
+        valid = stored['has_certificate']
+        ttl = self.positive_ttl if valid else self.negative_ttl
+        self._cache_verdict(domain, valid, ttl=stored['checked_at'] + ttl - time.time())
+        return valid
+
+    def _circuit_open(self, domain):
+        """Whether to skip probing a host that hasn't answered recently"""
+        if not self.circuit_breaker.is_open(domain):
+            return False
+        with self._stats_lock:
+            self.breaker_skips += 1
+        return True
+
+    def _record_verdict(self, domain, valid, failure_reason):
+        """Update the circuit breaker, cache and shared store after a probe"""
+        self._note_probe(domain, valid, failure_reason)
+        if self.domain_store is not None:
+            self.domain_store.put(domain, valid, failure_reason)
+
+    def _note_probe(self, domain, valid, failure_reason):
+        """Update the circuit breaker and cache after a probe"""
+        if failure_reason in ('timeout', 'unreachable'):
+            self.circuit_breaker.record_failure(domain)
+        else:
+            self.circuit_breaker.record_success(domain)
+        self._cache_verdict(domain, valid)
+
+    def _cache_verdict(self, domain, valid, ttl=None):
+        """Remember a verdict in memory for the positive or negative TTL (or the given TTL)"""
+        if self.cert_cache is None:
+            return
+        if ttl is None:
+            ttl = self.positive_ttl if valid else self.negative_ttl
+        if ttl > 0:
+            self.cert_cache.set(domain, valid, ttl=ttl)
+
+    def probe_certificate(self, domain):
+        """
+        Open a TLS connection to a domain and verify its certificate
+
+        Args:
+            domain (str): The domain name, optionally with a port
+                (e.g., 'google.com' or 'localhost:8443')
+
+        Returns:
+            tuple: (valid, failure_reason)
+                valid: True if certificate is valid
+                failure_reason: None, 'certificate', 'timeout' or 'unreachable'
+        """
+        start = time.perf_counter()
+        valid, failure_reason = self._probe(domain)
+        self._count_probe(start, failure_reason)
+        return valid, failure_reason
+
+    async def probe_certificate_async(self, domain):
+        """
+        Open a TLS connection with asyncio streams and verify the certificate
+
+        Args:
+            domain (str): The domain name, optionally with a port
+
+        Returns:
+            tuple: (valid, failure_reason), as for probe_certificate
+        """
+        start = time.perf_counter()
+        valid, failure_reason = await self._probe_async(domain)
+        self._count_probe(start, failure_reason)
+        return valid, failure_reason
+
+    def _count_probe(self, start, failure_reason):
+        """Update probe counters and metrics"""
+        with self._stats_lock:
+            self.probes += 1
+
+        if self.metrics is None:
+            return
+        self.metrics['probe_seconds'].observe(time.perf_counter() - start)
+        self.metrics['probes'].inc()
+        if failure_reason is not None:
+            self.metrics['failures'].inc(reason=failure_reason)
+            if failure_reason == 'timeout':
+                self.metrics['timeouts'].inc()
+
+    def _probe(self, domain):
+        """Connect and verify a certificate (probe_certificate without bookkeeping)"""
         try:
-            # Create SSL context
-            context = ssl.create_default_context()
+            address = urlsplit('//' + domain)
+            host = address.hostname
+            port = address.port or 443
 
             # Try to connect and verify certificate
-            with socket.create_connection((domain, 443), timeout=5) as sock:
-                with context.wrap_socket(sock, server_hostname=domain) as ssock:
+            with socket.create_connection((host, port), timeout=self.timeout) as sock:
+                with self.ssl_context.wrap_socket(sock, server_hostname=host) as ssock:
                     # If we get here, certificate is valid
-                    return True
-        except:
-            # Any error means no valid certificate
-            return False
+                    return True, None
+        except ssl.SSLError:
+            # Host answered but the certificate or handshake was rejected
+            return False, 'certificate'
+        except socket.timeout:
+            return False, 'timeout'
+        except Exception:
+            # DNS failure, refused connection, etc.
+            return False, 'unreachable'
+
+    async def _probe_async(self, domain):
+        """Connect and verify a certificate on the event loop (same outcomes as _probe)"""
+        try:
+            address = urlsplit('//' + domain)
+            host = address.hostname
+            port = address.port or 443
+
+            # The timeout covers connecting and the handshake together
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=self.ssl_context, server_hostname=host),
+                self.timeout
+            )
+        except ssl.SSLError:
+            return False, 'certificate'
+        except asyncio.TimeoutError:
+            return False, 'timeout'
+        except Exception:
+            return False, 'unreachable'
+
+        writer.close()
+        return True, None
+
+    def cache_stats(self):
+        """
+        Get certificate cache and circuit breaker counters
+
+        Returns:
+            dict: Cache hits/misses, store hits, probes made and hosts being skipped
+        """
+        stats = self.cert_cache.stats() if self.cert_cache is not None else {
+            'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0, 'hit_rate': 0.0
+        }
+        stats['probes'] = self.probes
+        stats['breaker_skips'] = self.breaker_skips
+        stats['store_hits'] = self.store_hits
+        stats['open_circuits'] = len(self.circuit_breaker.open_hosts())
+        return stats
 
     def analyze_link(self, url):
         """
@@ -89,8 +523,9 @@ class LinkDetector:
 
         # Extract domain
         try:
-            parsed = urlparse(url)
-            domain = parsed.netloc
+            domain = canonical_host(url)
+            if domain is None:
+                raise ValueError(f"No host in {url}")
 
             # Check certificate (only for HTTPS)
             if result['is_https']:
@@ -119,21 +554,217 @@ class LinkDetector:
         Returns:
             bool: True if any suspicious links found, False otherwise
         """
+        return self.check_links_detailed(email_text)['is_spam']
+
+    async def check_links_async(self, email_text):
+        """
+        Check all links in an email without blocking the event loop
+
+        Args:
+            email_text (str): The email content
+
+        Returns:
+            bool: True if any suspicious links found, False otherwise
+        """
+        return (await self.check_links_detailed_async(email_text))['is_spam']
+
+    def check_links_detailed(self, email_text, deadline=None):
+        """
+        Check links in an email, stopping as soon as the vote is settled
+
+        If the deadline passes before the vote is settled, analysis stops
+        and the report is marked partial, with is_spam None (no vote).
+
+        Args:
+            email_text (str): The email content
+            deadline (float): time.monotonic() value by which to stop
+                probing (None waits for every probe it needs)
+
+        Returns:
+            dict: Verdict plus how it was reached
+                is_spam: True if more than half the links are suspicious,
+                    None if the deadline cut the analysis short
+                total_links: Number of links found in the email
+                analyzed_links: Number of links actually analyzed
+                suspicious_links: Number of analyzed links that were suspicious
+                unique_domains: Number of distinct HTTPS hosts among the links
+                probed_domains: Number of hosts whose certificate was checked
+                sampled: True if only a sample of the links was considered
+                early_exit: True if analysis stopped once the outcome was fixed
+                partial: True if the deadline passed before the outcome was fixed
+        """
+        start = time.perf_counter()
         links = self.extract_links(email_text)
+        extracted = time.perf_counter()
+        report, tally, domains = self._plan_links(links)
+
+        if self._needs_probes(tally, deadline):
+            # Hosts with the most links first, since they move the vote most
+            ordered = sorted(domains, key=lambda domain: -domains[domain])
+            verdicts = self._iter_certificates(ordered, deadline)
+            try:
+                for domain, has_certificate in verdicts:
+                    report['probed_domains'] += 1
+                    tally.add(domains[domain], suspicious=not has_certificate)
+                    if tally.decided():
+                        break
+            finally:
+                verdicts.close()
+
+        return self._finish_report(report, tally, start, extracted)
+
+    async def check_links_detailed_async(self, email_text, deadline=None):
+        """
+        Check links in an email with asyncio certificate probes
 
-        # If no links, not suspicious based on this method
-        if not links:
-            return False
+        Same report and verdict as check_links_detailed, but probes run on
+        the event loop, so many emails can be checked at once on one thread.
 
-        # Analyze each link
-        suspicious_count = 0
-        for link in links:
-            analysis = self.analyze_link(link)
-            if analysis['is_suspicious']:
-                suspicious_count += 1
+        Args:
+            email_text (str): The email content
+            deadline (float): time.monotonic() value by which to stop
+                probing (None waits for every probe it needs)
+
+        Returns:
+            dict: Verdict plus how it was reached (see check_links_detailed)
+        """
+        start = time.perf_counter()
+        links = self.extract_links(email_text)
+        extracted = time.perf_counter()
+        report, tally, domains = self._plan_links(links)
+
+        if self._needs_probes(tally, deadline):
+            ordered = sorted(domains, key=lambda domain: -domains[domain])
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def check(domain):
+                async with semaphore:
+                    return domain, await self.check_certificate_async(domain)
+
+            # Tasks take the semaphore in creation order, so the busiest
+            # hosts are still probed first
+            tasks = [asyncio.ensure_future(check(domain)) for domain in ordered]
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                for next_verdict in asyncio.as_completed(tasks, timeout=timeout):
+                    domain, has_certificate = await next_verdict
+                    report['probed_domains'] += 1
+                    tally.add(domains[domain], suspicious=not has_certificate)
+                    if tally.decided():
+                        break
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return self._finish_report(report, tally, start, extracted)
+
+    def _plan_links(self, links):
+        """
+        Set up the vote for an email's links
 
+        Plain HTTP links (and links without a usable host) are suspicious
+        without a network round trip, so they are counted up front; they
+        often settle the vote on their own. HTTPS links are grouped by host
+        so each host is probed once, while every link still gets a vote.
+
+        Returns:
+            tuple: (report, tally, domains) where domains maps each HTTPS
+                host to its number of links
+        """
+        report = {
+            'is_spam': False,
+            'total_links': len(links),
+            'analyzed_links': 0,
+            'suspicious_links': 0,
+            'unique_domains': 0,
+            'probed_domains': 0,
+            'sampled': False,
+            'early_exit': False,
+            'partial': False
+        }
+
+        if self.max_links and len(links) > self.max_links:
+            links = sample_links(links, self.max_links)
+            report['sampled'] = True
+
+        tally = _LinkTally(len(links))
+        domains = {}
+        for link in links:
+            domain = canonical_host(link) if self.is_https(link) else None
+            if domain is None:
+                tally.add(1, suspicious=True)
+            else:
+                domains[domain] = domains.get(domain, 0) + 1
+        report['unique_domains'] = len(domains)
+        return report, tally, domains
+
+    def _needs_probes(self, tally, deadline):
+        """Whether certificate checks are still needed (and there's time for them)"""
+        out_of_time = deadline is not None and time.monotonic() >= deadline
+        return not tally.decided() and not out_of_time
+
+    def _finish_report(self, report, tally, start, extracted):
+        """Fill in the verdict, counts, metrics and timings"""
         # If more than half the links are suspicious, flag as spam
-        return suspicious_count > len(links) / 2
+        report['is_spam'] = tally.suspicious >= tally.needed
+        if not tally.decided():
+            # Out of time with the outcome still open: abstain rather than guess
+            report['is_spam'] = None
+            report['partial'] = True
+        report['analyzed_links'] = tally.analyzed
+        report['suspicious_links'] = tally.suspicious
+        report['early_exit'] = tally.analyzed < tally.total and not report['partial']
+
+        if self.metrics is not None:
+            self.metrics['links'].inc(tally.analyzed)
+        if self.collect_timings:
+            report['timings'] = {
+                'extract': extracted - start,
+                'analyze': time.perf_counter() - extracted,
+            }
+        return report
+
+    def _iter_certificates(self, domains, deadline=None):
+        """
+        Yield (domain, has_certificate) as checks finish, cancelling leftovers on close
+
+        Stops early (without error) once the deadline passes.
+        """
+        # Verdicts already known (cache, shared store or open circuit) are
+        # settled here, so only real probes go to worker threads
+        unknown = []
+        for domain in domains:
+            known = self._known_verdict(domain)
+            if known is None:
+                unknown.append(domain)
+            else:
+                yield domain, known
+        if not unknown:
+            return
+
+        workers = min(self.max_concurrency, len(unknown))
+        if workers <= 1 and deadline is None:
+            for domain in unknown:
+                yield domain, self._probe_and_record(domain)
+            return
+
+        # With a deadline, even a single probe runs on a worker thread so
+        # waiting for it can be abandoned when time runs out
+        pool = ThreadPoolExecutor(max_workers=max(workers, 1))
+        futures = {pool.submit(self._probe_and_record, domain): domain for domain in unknown}
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                yield futures[future], future.result()
+        except TimeoutError:
+            return
+        finally:
+            # Drop queued probes; in-flight ones finish in the background
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
 
 
 def main():
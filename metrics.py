@@ -0,0 +1,160 @@
+"""
+Metrics for the Spam Filter
+Process-wide counters and latency histograms with pluggable exporters
+(Prometheus text format or JSON)
+"""
+
+import bisect
+import json
+import threading
+
+
+# Latency buckets in seconds (upper bounds); +Inf is implied
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Add to the count for the given label values"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram:
+    """Counts observations in cumulative buckets, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation (e.g. a latency in seconds)"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {
+                    'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0
+                }
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+
+class MetricsRegistry:
+    """Holds named metrics and renders them with an exporter"""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, description):
+        """Get or create a counter"""
+        return self._get_or_create(Counter, name, description)
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        """Get or create a histogram"""
+        return self._get_or_create(Histogram, name, description, buckets)
+
+    def _get_or_create(self, metric_class, name, *args):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args)
+            return metric
+
+    def render(self, exporter=None):
+        """
+        Render all metrics
+
+        Args:
+            exporter: Object with a render(registry) method
+                (default: PrometheusExporter)
+
+        Returns:
+            str: The rendered metrics
+        """
+        return (exporter or PrometheusExporter()).render(self)
+
+
+def _format_labels(labels, extra=()):
+    """Format label pairs as {name="value",...}"""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusExporter:
+    """Renders metrics in the Prometheus text exposition format"""
+
+    content_type = 'text/plain; version=0.0.4'
+
+    def render(self, registry):
+        lines = []
+        for name in sorted(registry.metrics):
+            metric = registry.metrics[name]
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+
+            with metric._lock:
+                series = [
+                    (labels, dict(value, counts=list(value['counts'])) if metric.kind == 'histogram' else value)
+                    for labels, value in sorted(metric.values.items())
+                ]
+
+            for labels, value in series:
+                if metric.kind == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+
+                cumulative = 0
+                bounds = [str(bound) for bound in metric.buckets] + ['+Inf']
+                for bound, count in zip(bounds, value['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+class JSONExporter:
+    """Renders metrics as a JSON document"""
+
+    content_type = 'application/json'
+
+    def render(self, registry):
+        data = {}
+        for name, metric in registry.metrics.items():
+            with metric._lock:
+                data[name] = [
+                    dict(labels=dict(labels),
+                         value=dict(value, counts=list(value['counts'])) if metric.kind == 'histogram' else value)
+                    for labels, value in metric.values.items()
+                ]
+        return json.dumps(data)
+
+
+# Shared by everything in the process that opts in to metrics
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,174 @@
+"""
+Profiling Hooks for the Spam Filter
+Samples individual analyze_email calls (or catches slow ones) and writes
+cProfile dumps and span traces to a directory for later inspection
+
+Span traces use the Chrome trace-event format, so they open directly in
+chrome://tracing or https://ui.perfetto.dev. cProfile dumps (.prof) can be
+read with pstats or snakeviz.
+"""
+
+import cProfile
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+
+# The trace being recorded on the current thread (None when not profiling)
+_local = threading.local()
+
+
+class ProfilingHook:
+    """Decides which calls to profile and writes their traces"""
+
+    def __init__(self, output_dir='profiles', sample_rate=0.0, latency_threshold=None, seed=None):
+        """
+        Initialize the profiling hook
+
+        Args:
+            output_dir (str): Folder to write traces to (created if missing)
+            sample_rate (float): Fraction of calls to run under cProfile (0.0 - 1.0)
+            latency_threshold (float): Also write a span trace for any call
+                slower than this many seconds (None disables)
+            seed (int): Seed for the sampling decisions
+        """
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.latency_threshold = latency_threshold
+
+        self._random = random.Random(seed)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+        # Python 3.12+ allows only one active cProfile per process; sampled
+        # calls that overlap a running profile record just a span trace
+        self._profiler_lock = threading.Lock()
+
+        self.calls = 0
+        self.written = 0
+
+    def profile(self, function, *args):
+        """
+        Run a call, profiling it if it is sampled or turns out to be slow
+
+        Args:
+            function (callable): The call to run
+            *args: Arguments for the call
+
+        Returns:
+            Whatever the call returns
+        """
+        with self._lock:
+            self.calls += 1
+            sampled = self._random.random() < self.sample_rate
+
+        if not sampled and self.latency_threshold is None:
+            return function(*args)
+
+        spans = []
+        profiler = None
+        if sampled and self._profiler_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Some other profiler is already active in this process
+                profiler = None
+                self._profiler_lock.release()
+        _local.spans = spans
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiler_lock.release()
+            elapsed = time.perf_counter() - start
+            _local.spans = None
+
+            slow = self.latency_threshold is not None and elapsed >= self.latency_threshold
+            if sampled or slow:
+                self._write(start, elapsed, spans, profiler, 'sampled' if sampled else 'slow')
+
+    def record_span(self, name, start, end, **attributes):
+        """
+        Record a timed section of the call being profiled on this thread
+
+        Does nothing when the current call is not being traced.
+
+        Args:
+            name (str): Span name (e.g. a detector key)
+            start (float): time.perf_counter() at the start of the section
+            end (float): time.perf_counter() at the end of the section
+            **attributes: Extra details stored with the span
+        """
+        spans = getattr(_local, 'spans', None)
+        if spans is not None:
+            spans.append((name, start, end, attributes))
+
+    def _write(self, start, elapsed, spans, profiler, reason):
+        """Write the span trace (and cProfile dump, if any) for one call"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._sequence)}-{reason}"
+        base = os.path.join(self.output_dir, name)
+
+        events = [{
+            'name': 'analyze_email', 'ph': 'X', 'ts': 0, 'dur': elapsed * 1e6,
+            'pid': os.getpid(), 'tid': 0, 'args': {'reason': reason},
+        }]
+        for span_name, span_start, span_end, attributes in spans:
+            events.append({
+                'name': span_name, 'ph': 'X',
+                'ts': (span_start - start) * 1e6, 'dur': (span_end - span_start) * 1e6,
+                'pid': os.getpid(), 'tid': 0, 'args': attributes,
+            })
+
+        with open(base + '.trace.json', 'w') as f:
+            json.dump({'traceEvents': events, 'seconds': elapsed, 'reason': reason}, f)
+        if profiler is not None:
+            profiler.dump_stats(base + '.prof')
+
+        with self._lock:
+            self.written += 1
+
+
+def summarize(output_dir, limit=10):
+    """
+    Print the slowest traces in a profile directory
+
+    Args:
+        output_dir (str): Folder the hook wrote traces to
+        limit (int): Number of traces to show
+    """
+    traces = []
+    for filename in os.listdir(output_dir):
+        if filename.endswith('.trace.json'):
+            with open(os.path.join(output_dir, filename)) as f:
+                traces.append((json.load(f), filename))
+
+    traces.sort(key=lambda item: item[0]['seconds'], reverse=True)
+    for trace, filename in traces[:limit]:
+        spans = ', '.join(
+            f"{event['name']} {event['dur'] / 1000:.1f}ms"
+            for event in trace['traceEvents'][1:]
+        )
+        print(f"{trace['seconds'] * 1000:8.1f}ms  {trace['reason']:<7}  {filename}")
+        if spans:
+            print(f"           {spans}")
+
+
+def main():
+    """Command-line tool for listing captured profiles"""
+    import sys
+
+    if len(sys.argv) > 1:
+        summarize(sys.argv[1])
+    else:
+        print("Usage: python profiling.py <profile_dir>")
+
+
+if __name__ == "__main__":
+    main()
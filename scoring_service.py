@@ -0,0 +1,378 @@
+"""
+Spam Scoring HTTP Service
+A small asyncio HTTP/1.1 server that keeps one warm SpamFilter in memory
+
+Endpoints:
+    POST /score        Score one email (JSON {"email": "..."} or a raw message body)
+    POST /score/batch  Score several emails (JSON {"emails": ["...", ...]})
+    GET  /health       Liveness check
+    GET  /metrics      Request counters, latency and detector statistics
+    GET  /metrics/prometheus  Process-wide metrics in Prometheus text format
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from metrics import REGISTRY, PrometheusExporter
+from profiling import ProfilingHook
+from spam_filter import SpamFilter
+
+
+# Largest request body accepted (bytes)
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    """An error that maps directly to an HTTP response"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ScoringService:
+    """Serves SpamFilter verdicts over HTTP without blocking the event loop"""
+
+    def __init__(self, spam_filter=None, request_timeout=30, threads=32, max_queued=None):
+        """
+        Initialize the scoring service
+
+        Args:
+            spam_filter (SpamFilter): Filter to use (default: a new SpamFilter
+                whose time budget is the request timeout)
+            request_timeout (float): Seconds before a scoring request fails with 504
+            threads (int): Threads available for blocking analysis work
+            max_queued (int): Emails queued or running on the threads before
+                new requests fail with 503 (default: 4 per thread)
+        """
+        self.spam_filter = spam_filter or SpamFilter(time_budget=request_timeout)
+        self.request_timeout = request_timeout
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+        # Work keeps running after its request times out, so the queue is
+        # bounded rather than letting abandoned emails pile up
+        self.max_queued = max_queued or threads * 4
+        self._queued = 0
+        self._queue_lock = threading.Lock()
+
+        self.started = time.time()
+        self.metrics = {
+            'requests': 0,
+            'emails_scored': 0,
+            'spam': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'total_scoring_seconds': 0.0,
+        }
+
+    async def score(self, email_text):
+        """
+        Score one email on the thread pool
+
+        Args:
+            email_text (str): The email content
+
+        Returns:
+            dict: verdict, results and seconds
+        """
+        scored = await self.score_many(self.spam_filter.analyze_email, [email_text])
+        return scored[0]
+
+    async def score_many(self, analyze, items):
+        """
+        Score several emails on the thread pool
+
+        Every email is queued before any is scored, so a request is either
+        accepted whole or rejected with 503 when the queue is full. Emails
+        still waiting for a thread when the request is cancelled (e.g. it
+        timed out) are dropped from the queue.
+
+        Args:
+            analyze (callable): SpamFilter method returning (verdict, results)
+            items (list): Argument for each call (email text or raw bytes)
+
+        Returns:
+            list: A dict of verdict, results and seconds per item
+        """
+        start = time.perf_counter()
+        futures = self._submit(analyze, items)
+        return await asyncio.gather(*(self._collect(future, start) for future in futures))
+
+    def _submit(self, analyze, items):
+        """Queue analysis work on the thread pool, or raise 503 if it is full"""
+        if len(items) > self.max_queued:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"At most {self.max_queued} emails per request")
+        with self._queue_lock:
+            if self._queued + len(items) > self.max_queued:
+                self.metrics['rejected'] += 1
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many emails queued; retry later")
+            self._queued += len(items)
+
+        futures = []
+        for item in items:
+            future = self.executor.submit(analyze, item)
+            future.add_done_callback(self._dequeue)
+            futures.append(future)
+        return futures
+
+    def _dequeue(self, future):
+        """Free a queue slot once its work finishes or is cancelled (any thread)"""
+        with self._queue_lock:
+            self._queued -= 1
+
+    async def _collect(self, future, start):
+        """Wait for one queued email and record its verdict"""
+        # Cancelling the wrapper also cancels the work if it hasn't started
+        verdict, results = await asyncio.wrap_future(future)
+        seconds = time.perf_counter() - start
+
+        self.metrics['emails_scored'] += 1
+        self.metrics['total_scoring_seconds'] += seconds
+        if verdict == "Spam":
+            self.metrics['spam'] += 1
+        return {'verdict': verdict, 'results': results, 'seconds': round(seconds, 6)}
+
+    async def handle_score(self, body, content_type):
+        """Handle POST /score"""
+        if content_type == 'application/json':
+            return await self.score(_json_field(body, 'email', str))
+
+        # Raw message body (text/plain or message/rfc822)
+        return await self.score_raw(body)
+
+    async def score_raw(self, body):
+        """Score a raw RFC 822 message, parsing it on the thread pool too"""
+        scored = await self.score_many(self.spam_filter.analyze_raw_email, [body])
+        return scored[0]
+
+    async def handle_batch(self, body):
+        """Handle POST /score/batch"""
+        emails = _json_field(body, 'emails', list)
+        if not all(isinstance(email_text, str) for email_text in emails):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'emails' must be a list of strings")
+        return {'results': await self.score_many(self.spam_filter.analyze_email, emails)}
+
+    def health(self):
+        """Handle GET /health"""
+        return {'status': 'ok', 'uptime_seconds': round(time.time() - self.started, 3)}
+
+    def metrics_snapshot(self):
+        """Handle GET /metrics"""
+        snapshot = dict(self.metrics, queued=self._queued)
+        scored = snapshot['emails_scored']
+        snapshot['average_scoring_seconds'] = (
+            snapshot['total_scoring_seconds'] / scored if scored else 0.0
+        )
+        snapshot['certificate_cache'] = self.spam_filter.link_detector.cache_stats()
+        snapshot['verdict_cache'] = self.spam_filter.verdict_cache_stats()
+        snapshot['detectors'] = self.spam_filter.detector_stats
+        return snapshot
+
+    async def dispatch(self, method, path, headers, body):
+        """
+        Route a request to its handler
+
+        Returns:
+            tuple: (HTTPStatus, response dict)
+        """
+        if path == '/health' and method == 'GET':
+            return HTTPStatus.OK, self.health()
+        if path == '/metrics' and method == 'GET':
+            return HTTPStatus.OK, self.metrics_snapshot()
+        if path == '/metrics/prometheus' and method == 'GET':
+            return HTTPStatus.OK, REGISTRY.render(PrometheusExporter())
+
+        if path not in ('/score', '/score/batch'):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown path: {path}")
+        if method != 'POST':
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+
+        content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+        if path == '/score':
+            handler = self.handle_score(body, content_type)
+        else:
+            handler = self.handle_batch(body)
+
+        try:
+            return HTTPStatus.OK, await asyncio.wait_for(handler, self.request_timeout)
+        except asyncio.TimeoutError:
+            self.metrics['timeouts'] += 1
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, "Scoring timed out")
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection (keep-alive supported)"""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+
+                self.metrics['requests'] += 1
+                self.metrics['in_flight'] += 1
+                try:
+                    status, payload = await self.dispatch(method, path, headers, body)
+                except HTTPError as e:
+                    self.metrics['errors'] += 1
+                    status, payload = e.status, {'error': e.message}
+                except Exception as e:
+                    self.metrics['errors'] += 1
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+                finally:
+                    self.metrics['in_flight'] -= 1
+
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                await _write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            await _write_response(writer, e.status, {'error': e.message}, False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8025):
+        """
+        Run the HTTP server until cancelled
+
+        Args:
+            host (str): Address to listen on
+            port (int): Port to listen on
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Spam scoring service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def _json_field(body, field, expected_type):
+    """Parse a JSON body and return one field of the expected type"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+    if not isinstance(data, dict) or not isinstance(data.get(field), expected_type):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing or invalid '{field}'")
+    return data[field]
+
+
+async def _read_request(reader):
+    """
+    Read one HTTP request
+
+    Returns:
+        tuple: (method, path, version, headers, body), or None at end of stream
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+
+    try:
+        method, path, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), path.split('?')[0], version, headers, body
+
+
+async def _write_response(writer, status, payload, keep_alive):
+    """Write a JSON response (or plain text, if payload is a string)"""
+    if isinstance(payload, str):
+        body = payload.encode('utf-8')
+        content_type = PrometheusExporter.content_type
+    else:
+        body = json.dumps(payload).encode('utf-8')
+        content_type = 'application/json'
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        f"\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+
+def main():
+    """Command-line entry point for the scoring service"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the spam scoring HTTP service")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8025, help="Port to listen on")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--threads", type=int, default=32, help="Threads for analysis work")
+    parser.add_argument("--max-queued", type=int, default=None,
+                        help="Emails queued for analysis before requests get 503 (default: 4 per thread)")
+    parser.add_argument("--lazy", action="store_true", help="Skip detectors once the vote is decided")
+    parser.add_argument("--verdict-cache", type=int, default=10000,
+                        help="Verdicts remembered for repeated messages (0 disables)")
+    parser.add_argument("--domain-db", help="SQLite domain reputation store shared across processes")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Seconds each message may spend in analysis (partial link results after "
+                             "that; default: the request timeout)")
+    parser.add_argument("--signatures", default="spam_signatures.json",
+                        help="Signature database (.json, or .sig to memory-map it)")
+    parser.add_argument("--bloom", action="store_true",
+                        help="Check a Bloom filter before the signature database")
+    parser.add_argument("--profile-dir", help="Write sampled/slow scan profiles to this folder")
+    parser.add_argument("--profile-sample", type=float, default=0.0,
+                        help="Fraction of scans to run under cProfile")
+    parser.add_argument("--profile-threshold", type=float, default=None,
+                        help="Also trace any scan slower than this many seconds")
+    options = parser.parse_args()
+
+    profiler = None
+    if options.profile_dir:
+        profiler = ProfilingHook(options.profile_dir, sample_rate=options.profile_sample,
+                                 latency_threshold=options.profile_threshold)
+
+    # Analysis stops on its own around the time its request gives up on it
+    time_budget = options.time_budget if options.time_budget is not None else options.timeout
+
+    service = ScoringService(
+        SpamFilter(lazy=options.lazy, verdict_cache_size=options.verdict_cache,
+                   metrics=REGISTRY, profiler=profiler, domain_store=options.domain_db,
+                   time_budget=time_budget, signatures_file=options.signatures,
+                   bloom_prefilter=options.bloom),
+        request_timeout=options.timeout,
+        threads=options.threads,
+        max_queued=options.max_queued
+    )
+    try:
+        asyncio.run(service.serve(options.host, options.port))
+    except KeyboardInterrupt:
+        print("\nShutting down")
+
+
+if __name__ == "__main__":
+    main()
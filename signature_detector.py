@@ -4,37 +4,308 @@ Creates and compares hash signatures of emails to detect known spam
 """
 
 import hashlib
-import json
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from atomic_files import FileLock
+from bloom_filter import BloomFilter
+from email_ingest import RawEmail
+from fuzzy_signatures import FuzzySignatureIndex
+from signature_log import SignatureLog
+from signature_store import (BINARY_EXTENSION, MappedSignatureStore, SignatureStore,
+                             convert_json_to_binary)
+
+
+def email_digest(email_text):
+    """
+    Create the raw 32-byte SHA-256 digest of an email's normalized text
+
+    Args:
+        email_text (str): The email content
+
+    Returns:
+        bytes: Raw hash digest
+    """
+    # Normalize the text (remove extra whitespace, convert to lowercase)
+    normalized_text = ' '.join(email_text.lower().split())
+
+    # Create SHA-256 hash
+    hash_object = hashlib.sha256(normalized_text.encode('utf-8'))
+    return hash_object.digest()
+
+
+def iter_email_files(folder_path, recursive=False, extensions=('.txt',)):
+    """
+    Yield paths of email files in a folder using os.scandir
+
+    Args:
+        folder_path (str): Folder to scan
+        recursive (bool): Whether to descend into subfolders
+        extensions (tuple): File extensions to include
+
+    Yields:
+        str: Path to each matching file
+    """
+    pending = [folder_path]
+    while pending:
+        current = pending.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(entry.path)
+                elif entry.is_file() and entry.name.endswith(extensions):
+                    yield entry.path
+
+
+def _digest_file(filepath, hasher=None):
+    """Read and hash one email file (runs in a worker process)"""
+    try:
+        email_text = RawEmail.from_file(filepath).text
+        fingerprint = hasher.fingerprint(email_text) if hasher else None
+        return filepath, email_digest(email_text), fingerprint, None
+    except Exception as e:
+        return filepath, None, None, str(e)
 
 
 class SignatureDetector:
     """Detects spam using hash signatures of known spam emails"""
 
-    def __init__(self, signatures_file='spam_signatures.json'):
+    def __init__(self, signatures_file='spam_signatures.json', fuzzy=False,
+                 similarity_threshold=0.8, bloom=False, bloom_error_rate=0.01,
+                 reload_interval=1.0, compact_threshold=10000):
         """
         Initialize the signature detector
 
         Args:
-            signatures_file (str): Path to JSON file storing spam signatures
+            signatures_file (str): Path to the spam signatures, either JSON or a
+                binary '.sig' file (memory-mapped, for fast startup)
+            fuzzy (bool): Also match near-duplicates with MinHash/LSH fingerprints
+            similarity_threshold (float): Minimum similarity for a fuzzy match
+            bloom (bool): Check a Bloom filter before the signature store, so
+                most non-matching emails skip the authoritative lookup
+            bloom_error_rate (float): Target false-positive rate of the filter
+            reload_interval (float): Seconds between checks for signatures
+                added by other processes (None disables hot reload)
+            compact_threshold (int): Fold the signature log into the database
+                once it holds this many entries
         """
         self.signatures_file = signatures_file
-        self.spam_signatures = self.load_signatures()
+
+        # New signatures are appended to a log beside the database; the
+        # database itself is only rewritten when the log is compacted.
+        # Appends share the lock file, compaction holds it exclusively.
+        # Side files are named after the whole database filename, so a .json
+        # and a .sig database in one folder never share a log or lock
+        self.signature_log = SignatureLog(signatures_file + '.log')
+        self.lock_file = signatures_file + '.lock'
+        self.compact_threshold = compact_threshold
+        self._unsaved = []
+        self._unsaved_fingerprints = []
+
+        self._snapshot_version = self._file_version()
+        self.spam_signatures, log_digests = self._load_snapshot()
+
+        self.reload_interval = reload_interval
+        self._next_reload = time.monotonic() + (reload_interval or 0)
+        self._reload_lock = threading.Lock()
+
+        # Near-duplicate fingerprints live next to the exact signatures
+        self.fuzzy = fuzzy
+        self.fuzzy_file = signatures_file + '.fuzzy'
+        self.fuzzy_index = None
+        if fuzzy:
+            self.fuzzy_index = FuzzySignatureIndex.load(self.fuzzy_file, threshold=similarity_threshold)
+
+        # The prefilter is persisted next to the signatures too, tagged with
+        # the database file it was built from. One built from any other
+        # database (even one of the same size) could miss matches, so it is
+        # rebuilt; log entries aren't in the tag and are always added
+        self.bloom_file = signatures_file + '.bloom'
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom_filter = None
+        self.bloom_rejects = 0
+        if bloom:
+            self.bloom_filter = BloomFilter.load(self.bloom_file)
+            if (self.bloom_filter is None or self.bloom_filter.source != self._bloom_source()
+                    or self.bloom_filter.error_rate != bloom_error_rate):
+                self.bloom_filter = self.build_bloom_filter()
+                try:
+                    self.bloom_filter.save(self.bloom_file)
+                except OSError:
+                    # Read-only folder: rebuild again next time
+                    pass
+            else:
+                for digest in log_digests:
+                    self.bloom_filter.add(digest)
+
+    @property
+    def is_binary(self):
+        """Whether the signatures live in a memory-mapped binary file"""
+        return self.signatures_file.endswith(BINARY_EXTENSION)
 
     def load_signatures(self):
-        """Load spam signatures from file"""
-        if os.path.exists(self.signatures_file):
-            try:
-                with open(self.signatures_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+        """
+        Load spam signatures from file into a hash-indexed store
+
+        Returns:
+            The store (empty if no database exists yet)
+
+        Raises:
+            ValueError: If the database file is corrupt
+        """
+        return self._load_snapshot()[0]
+
+    def _load_snapshot(self):
+        """Load the database plus every entry in the signature log (store, log entries)"""
+        if self.is_binary:
+            store = MappedSignatureStore(self.signatures_file)
+        else:
+            store = SignatureStore.from_json_file(self.signatures_file)
+        log_digests = self.signature_log.read_all()
+        for digest in log_digests:
+            store.add(digest)
+        return store, log_digests
+
+    def _file_version(self):
+        """Identify the database file's current contents (None if missing)"""
+        try:
+            stat = os.stat(self.signatures_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
 
     def save_signatures(self):
-        """Save spam signatures to file"""
-        with open(self.signatures_file, 'w') as f:
-            json.dump(self.spam_signatures, f, indent=2)
+        """
+        Save newly trained signatures by appending them to the log
+
+        Safe to call from many processes at once: appends run side by side,
+        and fuzzy fingerprints are merged with what other trainers saved.
+        """
+        if self._unsaved:
+            with FileLock(self.lock_file, shared=True):
+                self.signature_log.append(self._unsaved)
+            self._unsaved = []
+        if self.fuzzy_index is not None and self._unsaved_fingerprints:
+            self._save_fuzzy_index()
+
+        if self.signature_log.entry_count() >= self.compact_threshold:
+            self.compact_signatures()
+        elif self.bloom_filter is not None:
+            self.bloom_filter.save(self.bloom_file)
+
+    def _save_fuzzy_index(self):
+        """Merge new fingerprints into the saved fuzzy index and write it back"""
+        with FileLock(self.lock_file):
+            merged = FuzzySignatureIndex.load(self.fuzzy_file, threshold=self.fuzzy_index.threshold)
+            for fingerprint in self._unsaved_fingerprints:
+                merged.add_if_new(fingerprint)
+            merged.save(self.fuzzy_file)
+        self.fuzzy_index = merged
+        self._unsaved_fingerprints = []
+
+    def compact_signatures(self):
+        """
+        Fold the signature log into the database file
+
+        Holds the lock exclusively, so no append can land in the log while
+        it is being folded in, and the database is replaced atomically.
+
+        Returns:
+            int: Number of signatures in the database afterwards
+        """
+        with FileLock(self.lock_file):
+            self.reload_signatures()
+            for digest in self.signature_log.start_compaction():
+                self.spam_signatures.add(digest)
+
+            if self.is_binary:
+                self.spam_signatures.save_binary_file(self.signatures_file)
+            else:
+                self.spam_signatures.save_json_file(self.signatures_file)
+            self.signature_log.finish_compaction()
+            self._snapshot_version = self._file_version()
+
+        if self.bloom_filter is not None:
+            # Re-sized for the current database at every compaction
+            self.bloom_filter = self.build_bloom_filter()
+            self.bloom_filter.save(self.bloom_file)
+        return len(self.spam_signatures)
+
+    def reload_signatures(self):
+        """
+        Pick up signatures saved by other processes
+
+        Normally only the log entries appended since the last call are read.
+        If another process compacted the log, the new database is loaded
+        and swapped in whole; scans in other threads keep using the old
+        store until the swap.
+
+        Returns:
+            int: Number of signatures gained
+        """
+        before = len(self.spam_signatures)
+        version = self._file_version()
+        if version != self._snapshot_version:
+            try:
+                store = self._load_snapshot()[0]
+            except (OSError, ValueError):
+                # Caught the database mid-write; try again next time
+                return 0
+            for digest in self._unsaved:
+                store.add(digest)
+            self._snapshot_version = version
+            self.spam_signatures = store
+            if self.bloom_filter is not None:
+                self.bloom_filter = self.build_bloom_filter()
+        else:
+            for digest in self.signature_log.read_new():
+                if self.spam_signatures.add(digest) and self.bloom_filter is not None:
+                    self.bloom_filter.add(digest)
+        return len(self.spam_signatures) - before
+
+    def _maybe_reload(self):
+        """Reload if the interval has passed and no other thread is reloading"""
+        if self.reload_interval is None or time.monotonic() < self._next_reload:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_reload = time.monotonic() + self.reload_interval
+            self.reload_signatures()
+        except OSError:
+            pass
+        finally:
+            self._reload_lock.release()
+
+    def build_bloom_filter(self):
+        """
+        Build a Bloom filter holding every current signature
+
+        Returns:
+            BloomFilter: The filter (not yet saved)
+        """
+        bloom = BloomFilter.from_items(self.spam_signatures, self.bloom_error_rate)
+        bloom.source = self._bloom_source()
+        return bloom
+
+    def _bloom_source(self):
+        """Tag for a Bloom filter built from the loaded database file"""
+        return hashlib.sha256(repr(self._snapshot_version).encode('ascii')).digest()
+
+    def bloom_stats(self):
+        """
+        Get Bloom filter size, accuracy and how many lookups it answered
+
+        Returns:
+            dict: Filter statistics plus 'rejects', or None if disabled
+        """
+        if self.bloom_filter is None:
+            return None
+        return dict(self.bloom_filter.stats(), rejects=self.bloom_rejects)
 
     def create_signature(self, email_text):
         """
@@ -46,25 +317,54 @@ class SignatureDetector:
         Returns:
             str: Hexadecimal hash signature
         """
-        # Normalize the text (remove extra whitespace, convert to lowercase)
-        normalized_text = ' '.join(email_text.lower().split())
+        return self.create_digest(email_text).hex()
 
-        # Create SHA-256 hash
-        hash_object = hashlib.sha256(normalized_text.encode('utf-8'))
-        return hash_object.hexdigest()
+    def create_digest(self, email_text):
+        """
+        Create the raw 32-byte SHA-256 digest of an email
+
+        Args:
+            email_text (str): The email content
+
+        Returns:
+            bytes: Raw hash digest
+        """
+        return email_digest(email_text)
 
-    def train_on_spam(self, spam_email_text):
+    def train_on_spam(self, spam_email_text, save=True):
         """
         Add a spam email to the signature database
 
         Args:
             spam_email_text (str): Content of a spam email
+            save (bool): Whether to write the database to disk immediately
+
+        Returns:
+            bool: True if a new signature was added, False otherwise
         """
-        signature = self.create_signature(spam_email_text)
-        if signature not in self.spam_signatures:
-            self.spam_signatures.append(signature)
-            self.save_signatures()
-            print(f"Added spam signature: {signature[:16]}...")
+        digest = self.create_digest(spam_email_text)
+        fingerprint = None
+        if self.fuzzy_index is not None:
+            fingerprint = self.fuzzy_index.hasher.fingerprint(spam_email_text)
+
+        if self._add_trained(digest, fingerprint):
+            if save:
+                self.save_signatures()
+            print(f"Added spam signature: {digest.hex()[:16]}...")
+            return True
+        return False
+
+    def _add_trained(self, digest, fingerprint=None):
+        """Add a trained signature (and fingerprint), queueing it for the next save"""
+        added = self.spam_signatures.add(digest)
+        if added:
+            self._unsaved.append(digest)
+            if self.bloom_filter is not None:
+                self.bloom_filter.add(digest)
+        if fingerprint is not None and self.fuzzy_index.add_if_new(fingerprint):
+            self._unsaved_fingerprints.append(fingerprint)
+            added = True
+        return added
 
     def train_on_spam_folder(self, folder_path):
         """
@@ -78,43 +378,155 @@ class SignatureDetector:
             return
 
         count = 0
+        added = 0
         for filename in os.listdir(folder_path):
             if filename.endswith('.txt'):
                 filepath = os.path.join(folder_path, filename)
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        email_text = f.read()
-                    self.train_on_spam(email_text)
+                    # Same ingestion as analysis, so the signatures match
+                    email_text = RawEmail.from_file(filepath).text
+                    if self.train_on_spam(email_text, save=False):
+                        added += 1
                     count += 1
                 except Exception as e:
                     print(f"Error reading {filename}: {e}")
 
+        # Append to the signature log once for the whole folder
+        if added:
+            self.save_signatures()
+
         print(f"\nTrained on {count} spam emails")
         print(f"Total signatures in database: {len(self.spam_signatures)}")
 
-    def check_signature(self, email_text):
+    def train_bulk(self, folder_path, recursive=False, workers=None,
+                   chunksize=64, progress_every=1000, commit_every=10000):
+        """
+        Train on a large folder of spam emails, hashing on a process pool
+
+        Files are discovered with os.scandir, hashed in parallel, deduplicated
+        in memory and appended to the signature log in batches, so other
+        trainers and running filters see progress during long runs.
+
+        Args:
+            folder_path (str): Path to folder containing spam email .txt files
+            recursive (bool): Whether to include subfolders
+            workers (int): Number of worker processes (default: CPU count)
+            chunksize (int): Number of files sent to a worker at a time
+            progress_every (int): Print progress after this many files
+            commit_every (int): Save after this many new signatures
+
+        Returns:
+            dict: Counts of files processed, signatures added and errors
+        """
+        stats = {'processed': 0, 'added': 0, 'errors': 0, 'seconds': 0.0}
+        if not os.path.isdir(folder_path):
+            print(f"Folder not found: {folder_path}")
+            return stats
+
+        paths = list(iter_email_files(folder_path, recursive=recursive))
+        print(f"Found {len(paths)} email file(s)")
+
+        hasher = self.fuzzy_index.hasher if self.fuzzy_index is not None else None
+        digest_file = partial(_digest_file, hasher=hasher)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for filepath, digest, fingerprint, error in pool.map(digest_file, paths, chunksize=chunksize):
+                stats['processed'] += 1
+                if error is not None:
+                    stats['errors'] += 1
+                    print(f"Error reading {filepath}: {error}")
+                elif self._add_trained(digest, fingerprint):
+                    stats['added'] += 1
+                    if len(self._unsaved) >= commit_every:
+                        self.save_signatures()
+
+                if stats['processed'] % progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    rate = stats['processed'] / elapsed if elapsed else 0.0
+                    print(f"  {stats['processed']}/{len(paths)} emails ({rate:.0f} emails/sec)")
+
+        # Commit whatever is left from the last batch
+        if self._unsaved or self._unsaved_fingerprints:
+            self.save_signatures()
+
+        stats['seconds'] = time.perf_counter() - start
+        rate = stats['processed'] / stats['seconds'] if stats['seconds'] else 0.0
+        print(f"\nTrained on {stats['processed']} spam emails in {stats['seconds']:.1f}s "
+              f"({rate:.0f} emails/sec)")
+        print(f"New signatures: {stats['added']}, errors: {stats['errors']}")
+        print(f"Total signatures in database: {len(self.spam_signatures)}")
+        return stats
+
+    def check_signature(self, email_text, digest=None):
         """
         Check if an email's signature matches known spam
 
         Args:
             email_text (str): The email to check
+            digest (bytes): The email's create_digest(), if already computed
 
         Returns:
             bool: True if spam signature detected, False otherwise
         """
-        if not self.spam_signatures:
-            # No signatures to compare against
-            return False
+        return self.find_match(email_text, digest) > 0.0
+
+    def find_match(self, email_text, digest=None):
+        """
+        Find how closely an email matches known spam
+
+        The exact hash is checked first (behind the Bloom filter, if
+        enabled); if fuzzy matching is enabled the LSH index is consulted
+        for near-duplicates.
+
+        Args:
+            email_text (str): The email to check
+            digest (bytes): The email's create_digest(), if already computed
+
+        Returns:
+            float: 1.0 for an exact match, the estimated similarity for a
+                fuzzy match, or 0.0 if nothing matched
+        """
+        self._maybe_reload()
+
+        if digest is None:
+            digest = self.create_digest(email_text)
+        if self.bloom_filter is not None and digest not in self.bloom_filter:
+            # Definitely not a known signature
+            self.bloom_rejects += 1
+        elif digest in self.spam_signatures:
+            return 1.0
 
-        signature = self.create_signature(email_text)
-        return signature in self.spam_signatures
+        if self.fuzzy_index:
+            fingerprint = self.fuzzy_index.hasher.fingerprint(email_text)
+            return self.fuzzy_index.query(fingerprint)
+
+        return 0.0
 
 
 def main():
     """Command-line tool for training the signature detector"""
     import sys
 
-    detector = SignatureDetector()
+    fuzzy = '--fuzzy' in sys.argv
+    if fuzzy:
+        sys.argv.remove('--fuzzy')
+    bloom = '--bloom' in sys.argv
+    if bloom:
+        sys.argv.remove('--bloom')
+
+    signatures_file = 'spam_signatures.json'
+    if '--signatures' in sys.argv:
+        index = sys.argv.index('--signatures')
+        signatures_file = sys.argv[index + 1]
+        del sys.argv[index:index + 2]
+
+    if len(sys.argv) > 3 and sys.argv[1] == "convert":
+        count = convert_json_to_binary(sys.argv[2], sys.argv[3])
+        print(f"Wrote {count} signatures to {sys.argv[3]}")
+        return
+
+    detector = SignatureDetector(signatures_file=signatures_file, fuzzy=fuzzy, bloom=bloom)
 
     if len(sys.argv) > 1:
         command = sys.argv[1]
@@ -124,20 +536,48 @@ def main():
             print(f"Training on spam emails in: {folder_path}")
             detector.train_on_spam_folder(folder_path)
 
+        elif command == "train-bulk" and len(sys.argv) > 2:
+            folder_path = sys.argv[2]
+            options = sys.argv[3:]
+            workers = None
+            if '--workers' in options:
+                workers = int(options[options.index('--workers') + 1])
+            commit_every = 10000
+            if '--commit-every' in options:
+                commit_every = int(options[options.index('--commit-every') + 1])
+            print(f"Bulk training on spam emails in: {folder_path}")
+            detector.train_bulk(folder_path, recursive='--recursive' in options, workers=workers,
+                                commit_every=commit_every)
+
+        elif command == "compact":
+            count = detector.compact_signatures()
+            print(f"Compacted signature log; {count} signatures in {detector.signatures_file}")
+
         elif command == "check" and len(sys.argv) > 2:
-            filepath = sys.argv[2]
-            with open(filepath, 'r', encoding='utf-8') as f:
-                email_text = f.read()
+            email_text = RawEmail.from_file(sys.argv[2]).text
 
-            is_spam = detector.check_signature(email_text)
-            print(f"\nSignature match: {'SPAM' if is_spam else 'NOT SPAM'}")
+            similarity = detector.find_match(email_text)
+            print(f"\nSignature match: {'SPAM' if similarity else 'NOT SPAM'}")
+            if 0.0 < similarity < 1.0:
+                print(f"Near-duplicate similarity: {similarity:.2f}")
 
         else:
             print("Usage:")
             print("  Train: python signature_detector.py train <folder_path>")
+            print("  Bulk:  python signature_detector.py train-bulk <folder_path> [--recursive] [--workers N] "
+                  "[--commit-every N]")
             print("  Check: python signature_detector.py check <email_file.txt>")
+            print("  Compact: python signature_detector.py compact")
+            print("  Convert: python signature_detector.py convert <signatures.json> <signatures.sig>")
+            print("  Add --fuzzy to any command to use near-duplicate matching")
+            print("  Add --bloom to any command to build and use a Bloom-filter prefilter")
+            print("  Add --signatures <file> to use another database (.sig files are memory-mapped)")
     else:
         print("Current signatures in database:", len(detector.spam_signatures))
+        stats = detector.bloom_stats()
+        if stats is not None:
+            print(f"Bloom filter: {stats['memory_bytes']} bytes, {stats['hashes']} hashes, "
+                  f"expected false-positive rate {stats['expected_error_rate']:.4%}")
 
 
 if __name__ == "__main__":
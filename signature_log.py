@@ -0,0 +1,167 @@
+"""
+Append-Only Signature Log
+New spam signatures are appended to a log beside the signature database
+instead of rewriting it, so running detectors can tail the log for new
+entries. Compaction periodically folds the log back into the database.
+"""
+
+import os
+
+from signature_store import DIGEST_SIZE, to_digest
+
+
+# Each entry is a hex digest and a newline
+LINE_SIZE = DIGEST_SIZE * 2 + 1
+
+
+class SignatureLog:
+    """Append-only log of hex signatures, one per line, with a tail cursor"""
+
+    def __init__(self, path):
+        """
+        Initialize the log
+
+        Args:
+            path (str): Path to the log file (created on first append)
+        """
+        self.path = path
+        self.compacting_path = path + '.compacting'
+
+        # Where read_new() left off: the log file it was reading (by inode,
+        # since compaction swaps in a new file) and the byte offset
+        self._inode = None
+        self._offset = 0
+
+    def append(self, digests):
+        """
+        Append signatures to the log
+
+        All lines go out in one O_APPEND write, so concurrent writers never
+        interleave within a line and readers never see half an entry.
+
+        Args:
+            digests (iterable): Raw 32-byte digests
+
+        Returns:
+            int: Number of signatures appended
+        """
+        lines = ''.join(digest.hex() + '\n' for digest in digests).encode('ascii')
+        if not lines:
+            return 0
+
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            view = memoryview(lines)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        return len(lines) // LINE_SIZE
+
+    def read_new(self):
+        """
+        Read entries appended since the last call
+
+        If the log was replaced by compaction, reading starts over on the
+        new file. An incomplete last line is left for the next call.
+
+        Returns:
+            list: Raw digests of the new entries
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._inode:
+                    self._inode = inode
+                    self._offset = 0
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            self._inode = None
+            self._offset = 0
+            return []
+
+        complete = data.rfind(b'\n') + 1
+        self._offset += complete
+        return _parse_lines(data[:complete])
+
+    def read_all(self):
+        """
+        Read every entry in the log and move the cursor to its end
+
+        Entries in a log set aside by a compaction still in progress are
+        included, since the database doesn't hold them yet.
+
+        Returns:
+            list: Raw digests
+        """
+        digests = []
+        if os.path.exists(self.compacting_path):
+            digests = self._read_compacting()
+        self._inode = None
+        self._offset = 0
+        return digests + self.read_new()
+
+    def size(self):
+        """
+        Get the number of bytes in the log
+
+        Returns:
+            int: Log size (0 if it doesn't exist)
+        """
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def entry_count(self):
+        """
+        Estimate the number of entries in the log
+
+        Returns:
+            int: Complete lines in the log
+        """
+        return self.size() // LINE_SIZE
+
+    def start_compaction(self):
+        """
+        Move the current log aside so new appends go to a fresh file
+
+        A log left aside by an interrupted compaction is kept as-is and
+        compacted instead, so no entries are ever overwritten.
+
+        Returns:
+            list: Raw digests in the set-aside log, to fold into the database
+        """
+        if not os.path.exists(self.compacting_path):
+            try:
+                os.replace(self.path, self.compacting_path)
+            except FileNotFoundError:
+                return []
+        return self._read_compacting()
+
+    def _read_compacting(self):
+        """Read the complete entries of the set-aside log"""
+        try:
+            with open(self.compacting_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        return _parse_lines(data[:data.rfind(b'\n') + 1])
+
+    def finish_compaction(self):
+        """Remove the set-aside log once the database holds its entries"""
+        try:
+            os.remove(self.compacting_path)
+        except FileNotFoundError:
+            pass
+
+
+def _parse_lines(data):
+    """Decode complete log lines, skipping any that aren't valid signatures"""
+    digests = []
+    for line in data.split(b'\n'):
+        digest = to_digest(line.strip().decode('ascii', 'replace'))
+        if digest is not None:
+            digests.append(digest)
+    return digests
@@ -0,0 +1,272 @@
+"""
+Signature Storage for Spam Detection
+Keeps spam signatures as raw SHA-256 digests in a hash set for fast lookups,
+or memory-maps a sorted binary file of digests so many processes share one copy
+"""
+
+import bisect
+import json
+import mmap
+import os
+
+from atomic_files import atomic_write
+
+
+DIGEST_SIZE = 32
+
+# Binary signature files are nothing but sorted raw digests, back to back
+BINARY_EXTENSION = '.sig'
+
+
+def to_digest(signature):
+    """
+    Convert a signature to its raw 32-byte digest form
+
+    Args:
+        signature (str or bytes): Hex signature or raw digest
+
+    Returns:
+        bytes: Raw digest, or None if the value is not a valid signature
+    """
+    if isinstance(signature, (bytes, bytearray)):
+        return bytes(signature) if len(signature) == DIGEST_SIZE else None
+    try:
+        digest = bytes.fromhex(signature)
+    except (TypeError, ValueError):
+        return None
+    return digest if len(digest) == DIGEST_SIZE else None
+
+
+class SignatureStore:
+    """Set-backed store of spam signature digests with O(1) membership"""
+
+    def __init__(self, signatures=()):
+        """
+        Initialize the signature store
+
+        Args:
+            signatures (iterable): Hex signatures or raw digests to load
+        """
+        self._digests = set()
+        for signature in signatures:
+            self.add(signature)
+
+    @classmethod
+    def from_json_file(cls, path):
+        """
+        Load a store from a JSON list of hex signatures
+
+        Args:
+            path (str): Path to the JSON signatures file
+
+        Returns:
+            SignatureStore: The loaded store (empty if the file is missing)
+
+        Raises:
+            ValueError: If the file exists but is not a valid signatures list
+        """
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as f:
+            try:
+                signatures = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"Signature file {path} is corrupt: {e}") from e
+        if not isinstance(signatures, list):
+            raise ValueError(f"Signature file {path} is not a list of signatures")
+        return cls(signatures)
+
+    def save_json_file(self, path):
+        """
+        Save the store as a JSON list of hex signatures
+
+        The file is replaced atomically, so readers never see it half-written.
+
+        Args:
+            path (str): Path to the JSON signatures file
+        """
+        atomic_write(path, json.dumps(self.hex_signatures(), indent=2).encode('utf-8'))
+
+    def add(self, signature):
+        """
+        Add a signature to the store
+
+        Args:
+            signature (str or bytes): Hex signature or raw digest
+
+        Returns:
+            bool: True if the signature was new, False otherwise
+        """
+        digest = to_digest(signature)
+        if digest is None or digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
+
+    def hex_signatures(self):
+        """
+        Get all signatures as sorted hex strings
+
+        Returns:
+            list: Hex signatures
+        """
+        return sorted(digest.hex() for digest in self._digests)
+
+    def __contains__(self, signature):
+        digest = to_digest(signature)
+        return digest is not None and digest in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+    def __iter__(self):
+        return iter(self._digests)
+
+
+def write_binary_file(digests, path):
+    """
+    Write digests as a sorted binary signature file
+
+    The file is replaced atomically, so processes that have the old file
+    mapped keep a consistent view.
+
+    Args:
+        digests (iterable): Raw 32-byte digests
+        path (str): Path to the binary signatures file
+
+    Returns:
+        int: Number of digests written
+    """
+    ordered = sorted(set(digests))
+    atomic_write(path, b''.join(ordered))
+    return len(ordered)
+
+
+def convert_json_to_binary(json_path, binary_path):
+    """
+    Convert a JSON list of hex signatures to a binary signature file
+
+    Args:
+        json_path (str): Existing JSON signatures file
+        binary_path (str): Binary file to create
+
+    Returns:
+        int: Number of signatures converted
+    """
+    return write_binary_file(SignatureStore.from_json_file(json_path), binary_path)
+
+
+class _DigestView:
+    """Sequence of the digests in a mapped file, for bisect"""
+
+    def __init__(self, buffer, count):
+        self.buffer = buffer
+        self.count = count
+
+    def __getitem__(self, index):
+        offset = index * DIGEST_SIZE
+        return self.buffer[offset:offset + DIGEST_SIZE]
+
+    def __len__(self):
+        return self.count
+
+
+class MappedSignatureStore:
+    """Memory-mapped file of sorted digests with binary-search membership"""
+
+    def __init__(self, path):
+        """
+        Map a binary signatures file
+
+        Nothing is parsed up front, and every process mapping the same file
+        shares one copy in the page cache. Signatures added afterwards are
+        kept in memory until save_binary_file merges them into a new file.
+
+        Args:
+            path (str): Path to the binary signatures file (may not exist yet)
+        """
+        self.path = path
+        self._file = None
+        self._map = None
+        self._view = _DigestView(b'', 0)
+        self._added = SignatureStore()
+        self._open()
+
+    def _open(self):
+        """Map the file on disk (an empty or missing file maps nothing)"""
+        self.close()
+        if not os.path.exists(self.path):
+            return
+
+        size = os.path.getsize(self.path)
+        if size % DIGEST_SIZE:
+            raise ValueError(f"{self.path} is not a binary signature file "
+                             f"(size {size} is not a multiple of {DIGEST_SIZE})")
+        if size == 0:
+            return
+
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = _DigestView(self._map, size // DIGEST_SIZE)
+
+    def close(self):
+        """Unmap the file"""
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._file = None
+        self._map = None
+        self._view = _DigestView(b'', 0)
+
+    def _mapped_contains(self, digest):
+        index = bisect.bisect_left(self._view, digest)
+        return index < len(self._view) and self._view[index] == digest
+
+    def add(self, signature):
+        """
+        Add a signature (kept in memory until saved)
+
+        Args:
+            signature (str or bytes): Hex signature or raw digest
+
+        Returns:
+            bool: True if the signature was new, False otherwise
+        """
+        digest = to_digest(signature)
+        if digest is None or self._mapped_contains(digest):
+            return False
+        return self._added.add(digest)
+
+    def save_binary_file(self, path=None):
+        """
+        Merge added signatures into a new binary file and map it
+
+        Args:
+            path (str): Where to write (default: the mapped file)
+        """
+        path = path or self.path
+        write_binary_file(iter(self), path)
+        if path == self.path:
+            self._added = SignatureStore()
+            self._open()
+
+    def hex_signatures(self):
+        """
+        Get all signatures as sorted hex strings
+
+        Returns:
+            list: Hex signatures
+        """
+        return sorted(digest.hex() for digest in self)
+
+    def __contains__(self, signature):
+        digest = to_digest(signature)
+        return digest is not None and (self._mapped_contains(digest) or digest in self._added)
+
+    def __len__(self):
+        return len(self._view) + len(self._added)
+
+    def __iter__(self):
+        for index in range(len(self._view)):
+            yield self._view[index]
+        yield from self._added
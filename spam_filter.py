@@ -6,79 +6,385 @@ Date: December 2025
 Course: CYBER 424
 """
 
+import copy
+import threading
+import time
+
+from domain_store import DomainStore
+from email_ingest import RawEmail
 from signature_detector import SignatureDetector
 from link_detector import LinkDetector
 from unsubscribe_detector import UnsubscribeDetector
+from ttl_cache import TTLCache
+
+
+# Detection methods in their canonical (display) order
+METHODS = {
+    'signature': 'Signature-Based Detection',
+    'links': 'Hyperlink Analysis',
+    'unsubscribe': 'Unsubscribe Link Detection',
+}
+
+# Number of methods that must flag an email for a Spam verdict
+VOTES_NEEDED = 2
+
+# Starting cost estimates (seconds) used before any timings are measured
+DEFAULT_COSTS = {
+    'signature': 0.0001,
+    'links': 0.5,
+    'unsubscribe': 0.0001,
+}
 
 
 class SpamFilter:
     """Main spam filter that combines all three detection methods"""
 
-    def __init__(self):
-        self.signature_detector = SignatureDetector()
-        self.link_detector = LinkDetector()
+    def __init__(self, fuzzy_signatures=False, similarity_threshold=0.8,
+                 link_concurrency=8, max_links=None, lazy=False,
+                 verdict_cache_size=0, verdict_cache_ttl=300,
+                 collect_timings=False, metrics=None, profiler=None, domain_store=None,
+                 time_budget=None, signatures_file='spam_signatures.json', bloom_prefilter=False):
+        """
+        Initialize the spam filter
+
+        Args:
+            fuzzy_signatures (bool): Also match near-duplicate spam (MinHash/LSH)
+            similarity_threshold (float): Minimum similarity for a fuzzy match
+            link_concurrency (int): Maximum certificate checks in flight per email
+            max_links (int): Only analyze a deterministic sample of this many
+                links in link-heavy emails (None analyzes all of them)
+            lazy (bool): Run detectors cheapest-first and skip the rest once
+                the 2-of-3 vote is decided
+            verdict_cache_size (int): Remember this many verdicts, keyed by
+                the normalized content hash (0 disables the cache)
+            verdict_cache_ttl (float): Seconds a remembered verdict stays valid
+            collect_timings (bool): Add per-stage timings ('seconds', and
+                'timings' for link analysis) to each method's result
+            metrics (MetricsRegistry): Registry for process-wide counters and
+                latency histograms, e.g. metrics.REGISTRY (None disables metrics)
+            profiler (ProfilingHook): Samples calls (or slow calls) and writes
+                cProfile dumps and span traces (None disables profiling)
+            domain_store (str): Path to a persistent domain reputation database
+                shared with other processes (None keeps verdicts in memory only)
+            time_budget (float): Seconds each email may spend in analysis,
+                shared by all methods; link checks still pending when it runs
+                out are abandoned and the links result is marked partial
+                (None means no limit)
+            signatures_file (str): Spam signature database (JSON, or a binary
+                '.sig' file that worker processes memory-map and share)
+            bloom_prefilter (bool): Check a Bloom filter before the signature
+                database so most clean mail skips the full lookup
+        """
+        self.signature_detector = SignatureDetector(
+            signatures_file=signatures_file,
+            fuzzy=fuzzy_signatures,
+            similarity_threshold=similarity_threshold,
+            bloom=bloom_prefilter
+        )
+        self.link_detector = LinkDetector(
+            max_concurrency=link_concurrency,
+            max_links=max_links,
+            collect_timings=collect_timings,
+            metrics=metrics
+        )
+        if domain_store:
+            # Stored verdicts expire on the same TTLs as the in-memory cache
+            self.link_detector.domain_store = DomainStore(
+                domain_store,
+                positive_ttl=self.link_detector.positive_ttl,
+                negative_ttl=self.link_detector.negative_ttl
+            )
         self.unsubscribe_detector = UnsubscribeDetector()
 
-    def analyze_email(self, email_text):
+        # Measured cost and decisiveness of each method, seeded with a
+        # single pseudo-observation so the initial order is sensible
+        self.lazy = lazy
+        self.detector_stats = {
+            key: {'calls': 1, 'total_time': DEFAULT_COSTS[key], 'decisive': 0.5}
+            for key in METHODS
+        }
+        self._stats_lock = threading.Lock()
+
+        # Repeated campaign messages reuse the verdict of the first copy
+        self.verdict_cache = None
+        if verdict_cache_size:
+            self.verdict_cache = TTLCache(maxsize=verdict_cache_size, ttl=verdict_cache_ttl)
+
+        self.time_budget = time_budget
+        self.collect_timings = collect_timings
+        self.profiler = profiler
+        self.metrics = None
+        if metrics is not None:
+            self.metrics = {
+                'emails': metrics.counter('spam_emails_scanned_total', 'Emails analyzed, by verdict'),
+                'cache_hits': metrics.counter('spam_verdict_cache_hits_total',
+                                              'Emails answered from the verdict cache'),
+                'seconds': metrics.histogram('spam_analysis_seconds', 'Time to analyze one email'),
+                'detector_seconds': metrics.histogram('spam_detector_seconds',
+                                                      'Time spent in each detection method'),
+                'partial': metrics.counter('spam_partial_results_total',
+                                           'Emails whose link analysis ran out of time budget'),
+            }
+
+    def run_detector(self, key, email_text, deadline=None, digest=None):
         """
-        Analyze an email using all three methods
+        Run one detection method
 
         Args:
+            key (str): 'signature', 'links' or 'unsubscribe'
             email_text (str): The full text content of the email
+            deadline (float): time.monotonic() value by which link analysis
+                must stop (None for no limit)
+            digest (bytes): The email's signature digest, if already computed
 
         Returns:
-            tuple: (verdict, detailed_results)
-                verdict: "Spam" or "Not Spam"
-                detailed_results: dict with details from each method
+            dict: The method's result, including 'is_spam' and 'method'
         """
-        results = {}
-
         # Method 1: Signature-based detection
-        signature_match = self.signature_detector.check_signature(email_text)
-        results['signature'] = {
-            'is_spam': signature_match,
-            'method': 'Signature-Based Detection'
-        }
+        if key == 'signature':
+            signature_match = self.signature_detector.check_signature(email_text, digest)
+            return {
+                'is_spam': signature_match,
+                'method': METHODS[key]
+            }
 
         # Method 2: Link analysis
-        link_suspicious = self.link_detector.check_links(email_text)
-        results['links'] = {
-            'is_spam': link_suspicious,
-            'method': 'Hyperlink Analysis'
-        }
+        if key == 'links':
+            link_report = self.link_detector.check_links_detailed(email_text, deadline)
+            return dict(link_report, method=METHODS[key])
 
         # Method 3: Unsubscribe link presence
         has_unsubscribe = self.unsubscribe_detector.check_unsubscribe(email_text)
-        results['unsubscribe'] = {
+        return {
             'is_spam': not has_unsubscribe,  # No unsubscribe = spam
-            'method': 'Unsubscribe Link Detection'
+            'method': METHODS[key]
         }
 
-        # Determine final verdict (if any method flags it as spam, it's spam)
-        spam_count = sum([
-            results['signature']['is_spam'],
-            results['links']['is_spam'],
-            results['unsubscribe']['is_spam']
-        ])
+    def detector_order(self):
+        """
+        Order detectors for lazy evaluation
 
-        # If 2 or more methods say spam, it's spam
-        verdict = "Spam" if spam_count >= 2 else "Not Spam"
+        Detectors are ranked by average cost divided by how often their
+        vote agrees with the final verdict, so cheap, decisive methods run
+        first.
+
+        Returns:
+            list: Detector keys, cheapest-per-decision first
+        """
+        with self._stats_lock:
+            def score(key):
+                stats = self.detector_stats[key]
+                average_cost = stats['total_time'] / stats['calls']
+                decisiveness = max(stats['decisive'] / stats['calls'], 0.01)
+                return average_cost / decisiveness
+
+            return sorted(METHODS, key=score)
+
+    def analyze_email(self, email_text, on_stage=None):
+        """
+        Analyze an email using all three methods
+
+        In lazy mode, methods run cheapest-first and any method not needed
+        to decide the vote is reported with is_spam None and skipped True.
+        If the verdict cache is enabled, an email whose normalized content
+        was seen recently gets the earlier verdict without re-analysis.
+        With a time budget, link analysis that runs out of time is reported
+        with is_spam None and partial True, and the vote is taken from the
+        methods that finished.
+
+        Args:
+            email_text (str): The full text content of the email
+            on_stage (callable): Optional progress hook, called with each
+                method's key before it runs (or is skipped)
+
+        Returns:
+            tuple: (verdict, detailed_results)
+                verdict: "Spam" or "Not Spam"
+                detailed_results: dict with details from each method
+        """
+        if self.profiler is not None:
+            return self.profiler.profile(self._analyze_measured, email_text, on_stage)
+        return self._analyze_measured(email_text, on_stage)
 
+    def _analyze_measured(self, email_text, on_stage):
+        """Record process-wide metrics (if enabled) around the analysis"""
+        if self.metrics is None:
+            return self._analyze_cached(email_text, on_stage)
+
+        start = time.perf_counter()
+        verdict, results = self._analyze_cached(email_text, on_stage)
+        self._record_email(start, verdict)
+        return verdict, results
+
+    def _analyze_cached(self, email_text, on_stage):
+        """Consult the verdict cache (if enabled) before analyzing"""
+        key, cached = self._cached_verdict(email_text)
+        if cached is not None:
+            return cached
+
+        verdict, results = self._analyze(email_text, on_stage, key)
+        self._remember_verdict(key, verdict, results)
         return verdict, results
 
+    async def analyze_email_async(self, email_text, on_stage=None):
+        """
+        Analyze an email without blocking the event loop
+
+        Certificate probes use asyncio streams, so thousands of emails can
+        be in flight on one event loop; the signature and unsubscribe checks
+        are quick in-memory work and run inline. Verdicts, lazy evaluation,
+        the time budget, the verdict cache and metrics behave exactly as in
+        analyze_email (the profiler only samples synchronous calls).
+
+        Args:
+            email_text (str): The full text content of the email
+            on_stage (callable): Optional progress hook, called with each
+                method's key before it runs (or is skipped)
+
+        Returns:
+            tuple: (verdict, detailed_results), as for analyze_email
+        """
+        start = time.perf_counter()
+        key, cached = self._cached_verdict(email_text)
+        if cached is not None:
+            verdict, results = cached
+        else:
+            vote = _Vote(self)
+            for method in vote.order:
+                if vote.should_run(method, on_stage):
+                    method_start = time.perf_counter()
+                    result = await self.run_detector_async(method, email_text, vote.deadline, key)
+                    vote.record(method, result, method_start)
+            verdict, results = vote.finish()
+            self._remember_verdict(key, verdict, results)
+
+        if self.metrics is not None:
+            self._record_email(start, verdict)
+        return verdict, results
+
+    async def run_detector_async(self, key, email_text, deadline=None, digest=None):
+        """
+        Run one detection method, probing certificates with asyncio
+
+        Args:
+            key (str): 'signature', 'links' or 'unsubscribe'
+            email_text (str): The full text content of the email
+            deadline (float): time.monotonic() value by which link analysis
+                must stop (None for no limit)
+            digest (bytes): The email's signature digest, if already computed
+
+        Returns:
+            dict: The method's result, including 'is_spam' and 'method'
+        """
+        if key == 'links':
+            link_report = await self.link_detector.check_links_detailed_async(email_text, deadline)
+            return dict(link_report, method=METHODS[key])
+        return self.run_detector(key, email_text, deadline, digest)
+
+    def _record_email(self, start, verdict):
+        """Record the latency and verdict of one analyzed email"""
+        self.metrics['seconds'].observe(time.perf_counter() - start)
+        self.metrics['emails'].inc(verdict=verdict)
+
+    def _cached_verdict(self, email_text):
+        """
+        Look up a remembered verdict
+
+        Returns:
+            tuple: (key, cached) where cached is (verdict, results) or None;
+                key is the email's signature digest, or None when the
+                verdict cache is disabled
+        """
+        if self.verdict_cache is None:
+            return None, None
+
+        # Same key the signature detector uses, so formatting-only
+        # differences (case, whitespace) still hit
+        key = self.signature_detector.create_digest(email_text)
+        cached = self.verdict_cache.get(key)
+        if cached is None:
+            return key, None
+
+        if self.metrics is not None:
+            self.metrics['cache_hits'].inc()
+        verdict, results = cached
+        return key, (verdict, copy.deepcopy(results))
+
+    def _remember_verdict(self, key, verdict, results):
+        """Store a fresh verdict in the cache (if enabled)"""
+        # A verdict reached under time pressure isn't worth repeating
+        if key is not None and not results['links'].get('partial'):
+            self.verdict_cache.set(key, (verdict, copy.deepcopy(results)))
+
+    def verdict_cache_stats(self):
+        """
+        Get verdict cache counters
+
+        Returns:
+            dict: hits, misses, evictions, size and hit_rate (None if disabled)
+        """
+        if self.verdict_cache is None:
+            return None
+        return self.verdict_cache.stats()
+
+    def _analyze(self, email_text, on_stage, digest=None):
+        """Run the detectors and vote (analyze_email without the cache)"""
+        vote = _Vote(self)
+        for key in vote.order:
+            if vote.should_run(key, on_stage):
+                start = time.perf_counter()
+                vote.record(key, self.run_detector(key, email_text, vote.deadline, digest), start)
+        return vote.finish()
+
+    def _record_stats(self, timings, results, is_spam):
+        """Update per-detector cost and decisiveness statistics"""
+        with self._stats_lock:
+            for key, elapsed in timings.items():
+                stats = self.detector_stats[key]
+                stats['calls'] += 1
+                stats['total_time'] += elapsed
+                if results[key]['is_spam'] == is_spam:
+                    stats['decisive'] += 1
+
+    def analyze_raw_email(self, data):
+        """
+        Analyze a raw RFC 822 message
+
+        Only the text/plain and text/html parts are decoded; attachments
+        are skipped.
+
+        Args:
+            data (bytes): The raw message
+
+        Returns:
+            tuple: (verdict, detailed_results)
+        """
+        return self.analyze_email(RawEmail.from_bytes(data).text)
+
+    async def analyze_raw_email_async(self, data):
+        """
+        Analyze a raw RFC 822 message without blocking the event loop
+
+        Args:
+            data (bytes): The raw message
+
+        Returns:
+            tuple: (verdict, detailed_results)
+        """
+        return await self.analyze_email_async(RawEmail.from_bytes(data).text)
+
     def analyze_email_file(self, filepath):
         """
-        Analyze an email from a text file
+        Analyze an email from a file
 
         Args:
-            filepath (str): Path to the .txt file containing the email
+            filepath (str): Path to a .txt email or raw RFC 822 message
 
         Returns:
             tuple: (verdict, detailed_results)
         """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                email_text = f.read()
+            email_text = RawEmail.from_file(filepath).text
             return self.analyze_email(email_text)
         except FileNotFoundError:
             return "Error", {"error": f"File not found: {filepath}"}
@@ -86,10 +392,141 @@ class SpamFilter:
             return "Error", {"error": str(e)}
 
 
+class _Vote:
+    """The 2-of-3 vote for one email, shared by the sync and async pipelines"""
+
+    def __init__(self, spam_filter):
+        self.spam_filter = spam_filter
+        self.order = spam_filter.detector_order() if spam_filter.lazy else list(METHODS)
+        self.deadline = None
+        if spam_filter.time_budget is not None:
+            self.deadline = time.monotonic() + spam_filter.time_budget
+
+        self.results = {}
+        self.timings = {}
+        self.spam_count = 0
+        self.clean_count = 0
+
+    def should_run(self, key, on_stage):
+        """Report progress, and in lazy mode skip methods the vote no longer needs"""
+        if on_stage is not None:
+            on_stage(key)
+
+        decided = self.spam_count >= VOTES_NEEDED or self.clean_count > len(METHODS) - VOTES_NEEDED
+        if self.spam_filter.lazy and decided:
+            self.results[key] = {'is_spam': None, 'skipped': True, 'method': METHODS[key]}
+            return False
+        return True
+
+    def record(self, key, result, start):
+        """Count one method's result"""
+        spam_filter = self.spam_filter
+        self.results[key] = result
+        self.timings[key] = time.perf_counter() - start
+
+        if spam_filter.collect_timings:
+            result['seconds'] = self.timings[key]
+        if spam_filter.metrics is not None:
+            spam_filter.metrics['detector_seconds'].observe(self.timings[key], detector=key)
+        if spam_filter.profiler is not None:
+            spam_filter.profiler.record_span(key, start, start + self.timings[key],
+                                             is_spam=result['is_spam'])
+
+        if result['is_spam']:
+            self.spam_count += 1
+        elif result['is_spam'] is not None:
+            self.clean_count += 1
+        elif spam_filter.metrics is not None:
+            spam_filter.metrics['partial'].inc()
+
+    def finish(self):
+        """
+        Produce the verdict
+
+        Returns:
+            tuple: (verdict, detailed_results)
+        """
+        # If 2 or more methods say spam, it's spam
+        is_spam = self.spam_count >= VOTES_NEEDED
+        verdict = "Spam" if is_spam else "Not Spam"
+
+        self.spam_filter._record_stats(self.timings, self.results, is_spam)
+
+        # Report methods in their canonical order regardless of run order
+        return verdict, {key: self.results[key] for key in METHODS}
+
+
+def scan_command(args):
+    """
+    Bulk-scan a directory or maildir tree, writing JSON lines
+
+    Args:
+        args (list): Command-line arguments after 'scan'
+    """
+    import argparse
+    import sys
+    from batch_analyzer import load_scanned_paths, scan_directory
+
+    parser = argparse.ArgumentParser(prog="spam_filter.py scan",
+                                     description="Analyze every message under a directory")
+    parser.add_argument("directory", help="Directory or maildir tree to scan")
+    parser.add_argument("--output", help="JSONL file to write (default: stdout)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip messages already recorded in --output and append")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--chunksize", type=int, default=16, help="Messages per worker task")
+    parser.add_argument("--lazy", action="store_true", help="Skip detectors once the vote is decided")
+    parser.add_argument("--verdict-cache", type=int, default=10000,
+                        help="Verdicts each worker remembers for repeated messages (0 disables)")
+    parser.add_argument("--domain-db", help="SQLite domain reputation store shared by the workers")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Seconds each message may spend in analysis")
+    parser.add_argument("--signatures", default="spam_signatures.json",
+                        help="Signature database (.json, or .sig to memory-map it)")
+    parser.add_argument("--bloom", action="store_true",
+                        help="Check a Bloom filter before the signature database")
+    options = parser.parse_args(args)
+
+    if options.resume and not options.output:
+        parser.error("--resume requires --output")
+
+    skip = set()
+    if options.resume:
+        skip = load_scanned_paths(options.output)
+
+    output = sys.stdout
+    if options.output:
+        output = open(options.output, 'a' if options.resume else 'w', encoding='utf-8')
+
+    start = time.perf_counter()
+    try:
+        counts = scan_directory(options.directory, output, workers=options.workers,
+                                chunksize=options.chunksize, skip=skip,
+                                filter_options={'lazy': options.lazy,
+                                                'verdict_cache_size': options.verdict_cache,
+                                                'domain_store': options.domain_db,
+                                                'time_budget': options.time_budget,
+                                                'signatures_file': options.signatures,
+                                                'bloom_prefilter': options.bloom})
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    rate = counts['scanned'] / elapsed if elapsed else 0.0
+    print(f"Scanned {counts['scanned']} messages ({counts['spam']} spam, "
+          f"{counts['errors']} errors, {len(skip)} skipped) in {elapsed:.1f}s "
+          f"({rate:.0f} messages/sec)", file=sys.stderr)
+
+
 def main():
     """Command-line interface for the spam filter"""
     import sys
 
+    if len(sys.argv) > 1 and sys.argv[1] == "scan":
+        scan_command(sys.argv[2:])
+        return
+
     print("=" * 50)
     print("EMAIL SPAM FILTER")
     print("=" * 50)
@@ -116,7 +553,12 @@ def main():
         # Show each detection method's result
         for key, data in results.items():
             if key != 'error':
-                status = "SPAM" if data['is_spam'] else "NOT SPAM"
+                if data.get('skipped'):
+                    status = "SKIPPED"
+                elif data.get('partial'):
+                    status = "INCOMPLETE (time budget exhausted)"
+                else:
+                    status = "SPAM" if data['is_spam'] else "NOT SPAM"
                 print(f"{data['method']}: {status}")
 
         print()
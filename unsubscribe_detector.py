@@ -9,8 +9,17 @@ import re
 class UnsubscribeDetector:
     """Detects presence of unsubscribe links in emails"""
 
-    def __init__(self):
-        """Initialize the unsubscribe detector"""
+    def __init__(self, footer_first=True, footer_chars=2000):
+        """
+        Initialize the unsubscribe detector
+
+        Args:
+            footer_first (bool): Search the end of the email before the full body
+            footer_chars (int): Size of the footer region in characters
+        """
+        self.footer_first = footer_first
+        self.footer_chars = footer_chars
+
         # Multiple patterns to detect unsubscribe links/text
         self.unsubscribe_patterns = [
             r'unsubscribe',
@@ -22,11 +31,12 @@ class UnsubscribeDetector:
             r'subscription[\s]?settings',
         ]
 
-        # Compile patterns (case-insensitive)
-        self.compiled_patterns = [
-            re.compile(pattern, re.IGNORECASE)
-            for pattern in self.unsubscribe_patterns
-        ]
+        # Compile all patterns into one case-insensitive alternation so the
+        # text is scanned in a single pass
+        self.combined_pattern = re.compile(
+            '|'.join(f'(?:{pattern})' for pattern in self.unsubscribe_patterns),
+            re.IGNORECASE
+        )
 
     def check_unsubscribe(self, email_text):
         """
@@ -38,12 +48,13 @@ class UnsubscribeDetector:
         Returns:
             bool: True if unsubscribe option found, False otherwise
         """
-        # Check each pattern
-        for pattern in self.compiled_patterns:
-            if pattern.search(email_text):
+        # Unsubscribe text is almost always in the footer, so look there first
+        if self.footer_first and len(email_text) > self.footer_chars:
+            footer = email_text[-self.footer_chars:]
+            if self.combined_pattern.search(footer):
                 return True
 
-        return False
+        return self.combined_pattern.search(email_text) is not None
 
     def find_unsubscribe_matches(self, email_text):
         """
@@ -55,14 +66,7 @@ class UnsubscribeDetector:
         Returns:
             list: List of matched unsubscribe phrases
         """
-        matches = []
-
-        for i, pattern in enumerate(self.compiled_patterns):
-            found = pattern.findall(email_text)
-            if found:
-                matches.extend(found)
-
-        return matches
+        return [match.group(0) for match in self.combined_pattern.finditer(email_text)]
 
 
 def main():